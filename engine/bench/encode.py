@@ -0,0 +1,106 @@
+"""Compare the cost of encoding one game route response, old path vs new.
+
+``pydantic`` is what the routes used to do: copy the GameState into
+GameStateOut, wrap it in StateResponse, then let FastAPI validate it against
+the route's response model and dump it into a Response. ``orjson`` is what they do
+now: GameJSONResponse encodes the GameState dataclass directly.
+
+    python bench/encode.py --number 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from fastapi.responses import Response
+from fastapi.routing import APIRoute, serialize_response
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from engine import GameState
+from server import GameJSONResponse, GameStateOut, StateResponse, app
+
+STATE = GameState(
+    question="Is your character a YouTuber?",
+    step=7,
+    progression=42.1875,
+    win=False,
+    finished=False,
+    name_proposition=None,
+    description_proposition=None,
+)
+
+
+def _answer_route() -> APIRoute:
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.name == "answer":
+            return route
+    raise LookupError("no answer route")
+
+
+def _pydantic(route: APIRoute) -> Callable[[], bytes]:
+    async def encode() -> bytes:
+        out = StateResponse(
+            state=GameStateOut(
+                question=STATE.question,
+                step=STATE.step,
+                progression=STATE.progression,
+                win=STATE.win,
+                finished=STATE.finished,
+                name_proposition=STATE.name_proposition,
+                description_proposition=STATE.description_proposition,
+            )
+        )
+        body = await serialize_response(
+            field=route.response_field, response_content=out, dump_json=True
+        )
+        return Response(body, media_type="application/json").body
+
+    def run() -> bytes:
+        coro = encode()
+        # Nothing in serialize_response awaits, so drive it by hand rather
+        # than time an event loop round trip per call.
+        try:
+            coro.send(None)
+        except StopIteration as done:
+            return done.value
+        raise RuntimeError("serialize_response suspended")
+
+    return run
+
+
+def _orjson() -> bytes:
+    return GameJSONResponse({"state": STATE}).body
+
+
+def _time(fn: Callable[[], bytes], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Response encode micro-benchmark")
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    pydantic = _pydantic(_answer_route())
+    if json.loads(pydantic()) != json.loads(_orjson()):
+        raise SystemExit("the two paths encode different JSON")
+    results = {
+        name: _time(fn, args.number)
+        for name, fn in (("pydantic", pydantic), ("orjson", _orjson))
+    }
+    for name, seconds in results.items():
+        print(f"{name:<9} {seconds * 1e6:7.2f} us/response")
+    print(f"speedup   {results['pydantic'] / results['orjson']:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
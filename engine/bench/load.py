@@ -0,0 +1,238 @@
+"""Drive the engine with simulated players and report throughput and latency.
+
+By default this starts ``bench/stub.py`` and ``server.py`` (pointed at the
+stub) on free local ports, so it runs offline:
+
+    python bench/load.py --players 200 --duration 30
+
+Pass ``--engine-url`` to load an engine that is already running instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from curl_cffi import requests as curl_requests
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+KEYS = ("y", "n", "?", "+", "-")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_kib(pid: int) -> int:
+    out = subprocess.run(
+        ["ps", "-o", "rss=", "-p", str(pid)],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return int(out.stdout.strip() or 0)
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.errors: defaultdict[str, int] = defaultdict(int)
+        self.games = 0
+        self.wins = 0
+
+    def report(self, elapsed: float) -> str:
+        lines = [
+            (
+                f"games finished: {self.games} ({self.games / elapsed:.1f}/s), "
+                f"won by Akinator: {self.wins}"
+            ),
+            "",
+            (
+                f"{'route':<10} {'count':>7} {'errors':>7} "
+                f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+            ),
+        ]
+        for route in sorted(self.latencies.keys() | self.errors.keys()):
+            ordered = sorted(self.latencies[route]) or [0.0]
+            lines.append(
+                f"{route:<10} {len(self.latencies[route]):>7} "
+                f"{self.errors[route]:>7} "
+                + " ".join(
+                    f"{_percentile(ordered, q) * 1000:>8.1f}" for q in (0.5, 0.95, 0.99)
+                )
+            )
+        return "\n".join(lines)
+
+
+class Player:
+    def __init__(
+        self,
+        http: curl_requests.AsyncSession,
+        base_url: str,
+        recorder: Recorder,
+        args: argparse.Namespace,
+    ) -> None:
+        self._http = http
+        self._base_url = base_url
+        self._recorder = recorder
+        self._args = args
+
+    async def _post(self, route: str, path: str, body: dict | None = None) -> dict:
+        start = time.perf_counter()
+        try:
+            resp = await self._http.post(self._base_url + path, json=body)
+        except curl_requests.RequestsError:
+            self._recorder.errors[route] += 1
+            raise
+        if resp.status_code >= 400:
+            self._recorder.errors[route] += 1
+            raise RuntimeError(f"{route} -> {resp.status_code}")
+        self._recorder.latencies[route].append(time.perf_counter() - start)
+        return resp.json()
+
+    async def play(self) -> None:
+        data = await self._post("start", "/games", {"language": self._args.language})
+        game = f"/games/{data['session_id']}"
+        state = data["state"]
+        while not state["finished"]:
+            if state["win"]:
+                if random.random() < self._args.choose_rate:
+                    state = (await self._post("choose", f"{game}/choose"))["state"]
+                else:
+                    state = (await self._post("exclude", f"{game}/exclude"))["state"]
+            elif state["step"] and random.random() < self._args.back_rate:
+                state = (await self._post("back", f"{game}/back"))["state"]
+            else:
+                body = {"key": random.choice(KEYS)}
+                state = (await self._post("answer", f"{game}/answer", body))["state"]
+            if self._args.think:
+                await asyncio.sleep(random.uniform(0, 2 * self._args.think))
+        self._recorder.games += 1
+        self._recorder.wins += state["win"]
+
+    async def run(self, deadline: float) -> None:
+        while time.monotonic() < deadline:
+            try:
+                await self.play()
+            except (curl_requests.RequestsError, RuntimeError):
+                # Already counted against the route; start a fresh game.
+                await asyncio.sleep(0.1)
+
+
+async def _wait_until_up(url: str, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with curl_requests.AsyncSession() as http:
+        while True:
+            try:
+                await http.get(url, allow_redirects=False)
+                return
+            except curl_requests.RequestsError:
+                if time.monotonic() > deadline:
+                    raise SystemExit(f"{url} did not come up") from None
+                await asyncio.sleep(0.2)
+
+
+async def _live_sessions(http: curl_requests.AsyncSession, base_url: str) -> int:
+    resp = await http.get(base_url + "/metrics")
+    match = re.search(r"^akin_sessions (\S+)$", resp.text, re.MULTILINE)
+    return int(float(match.group(1))) if match else 0
+
+
+async def run(args: argparse.Namespace, engine_url: str, pid: int | None) -> None:
+    await _wait_until_up(engine_url + "/")
+    recorder = Recorder()
+    async with curl_requests.AsyncSession(max_clients=args.players) as http:
+        rss_before = _rss_kib(pid) if pid else 0
+        start = time.monotonic()
+        deadline = start + args.duration
+        players = [
+            Player(http, engine_url, recorder, args) for _ in range(args.players)
+        ]
+        await asyncio.gather(*(p.run(deadline) for p in players))
+        elapsed = time.monotonic() - start
+        print(recorder.report(elapsed))
+        if pid:
+            sessions = await _live_sessions(http, engine_url)
+            rss_after = _rss_kib(pid)
+            per_session = (rss_after - rss_before) * 1024 / max(1, sessions)
+            print(
+                f"\nengine RSS: {rss_before / 1024:.1f} -> {rss_after / 1024:.1f} MiB, "
+                f"{sessions} live sessions, ~{per_session:.0f} B/session"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Engine load test")
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--choose-rate", type=float, default=0.8)
+    parser.add_argument("--back-rate", type=float, default=0.05)
+    parser.add_argument(
+        "--think", type=float, default=0.0, help="Mean seconds between moves"
+    )
+    parser.add_argument("--engine-url", help="Load this engine instead of starting one")
+    parser.add_argument(
+        "--engine-pid", type=int, help="Report RSS for this process (with --engine-url)"
+    )
+    parser.add_argument("--latency", default="0.15", help="Stub median latency (s)")
+    parser.add_argument("--jitter", default="0.5", help="Stub log-normal shape")
+    parser.add_argument("--error-rate", default="0", help="Stub 503 rate")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.engine_url:
+        asyncio.run(run(args, args.engine_url.rstrip("/"), args.engine_pid))
+        return
+
+    stub_port, engine_port = _free_port(), _free_port()
+    stub = subprocess.Popen(
+        [
+            sys.executable,
+            str(ENGINE_DIR / "bench" / "stub.py"),
+            f"--port={stub_port}",
+            f"--latency={args.latency}",
+            f"--jitter={args.jitter}",
+            f"--error-rate={args.error_rate}",
+        ]
+    )
+    engine = subprocess.Popen(
+        [sys.executable, "server.py"],
+        cwd=ENGINE_DIR,
+        env={
+            **os.environ,
+            "AKIN_UPSTREAM_URL": f"http://127.0.0.1:{stub_port}",
+            "AKIN_HOST": "127.0.0.1",
+            "AKIN_PORT": str(engine_port),
+            "AKIN_PREWARM_LANGUAGES": args.language,
+        },
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        asyncio.run(run(args, f"http://127.0.0.1:{engine_port}", engine.pid))
+    finally:
+        for proc in (engine, stub):
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Measure the memory held per idle session and fail if it is over budget.
+
+Fills a MemorySessionStore with upstream game states shaped like the ones
+captured from akinator.com, then reports what tracemalloc saw allocated per
+session:
+
+    python bench/memory.py --sessions 100000 --budget 1536
+
+Every state is built from freshly decoded JSON, as it would be from an
+upstream response, so strings are only shared if the engine shares them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import gc
+import json
+import random
+import sys
+import tracemalloc
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from engine import UpstreamState
+from store import MemorySessionStore
+
+QUESTIONS = 2000
+NAMES = 500
+
+
+def _token(rng: random.Random, size: int) -> str:
+    return base64.urlsafe_b64encode(rng.randbytes(size)).decode().rstrip("=")
+
+
+def _cookies(rng: random.Random) -> dict[str, str]:
+    # The jar a game picks up: Cloudflare's bot-management and visitor
+    # cookies, and the site's own session cookie, in their usual shapes.
+    now = rng.randrange(1_700_000_000, 1_800_000_000)
+    return {
+        "__cf_bm": f"{_token(rng, 32)}-{now}-1.0.1.1-{_token(rng, 96)}",
+        "_cfuvid": f"{_token(rng, 32)}-{now}{rng.randrange(1000):03}-0.0.1.1-604800000",
+        "PHPSESSID": "".join(rng.choices("0123456789abcdefghijklmnopqrstuv", k=26)),
+    }
+
+
+def _upstream_json(rng: random.Random) -> str:
+    step = rng.randrange(40)
+    guessing = rng.random() < 0.1
+    name = rng.randrange(NAMES)
+    return json.dumps(
+        {
+            "language": "english",
+            "theme": "characters",
+            "child_mode": False,
+            "session_id": str(rng.randrange(10**8, 10**9)),
+            "signature": str(rng.randrange(10**9, 10**10)),
+            "identifiant": uuid.UUID(int=rng.getrandbits(128)).hex[:8],
+            "step": step,
+            "progression": rng.random() * 100,
+            "question": (
+                f"Does your character {rng.randrange(QUESTIONS)} "
+                "have anything to do with this question?"
+            ),
+            "proposition": "I think of",
+            "step_last_proposition": "",
+            "win": guessing,
+            "finished": False,
+            "completion": "OK",
+            "id_proposition": str(name) if guessing else None,
+            "name_proposition": f"Character {name}" if guessing else None,
+            "description_proposition": "A character" if guessing else None,
+            "flag_photo": 0,
+            "cookies": _cookies(rng),
+        }
+    )
+
+
+def measure(sessions: int, seed: int = 0) -> float:
+    """Bytes allocated per session held in the store."""
+    rng = random.Random(seed)
+    payloads = [_upstream_json(rng) for _ in range(sessions)]
+    ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in payloads]
+    store = MemorySessionStore(capacity=sessions, ttl=3600, sweep_interval=60)
+
+    async def fill() -> int:
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for session_id, payload in zip(ids, payloads):
+            await store.add(session_id, UpstreamState.from_dict(json.loads(payload)))
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return after - before
+
+    grown = asyncio.run(fill())
+    # The IDs were allocated up front, as the request that created each
+    # session would have; they stay alive as store keys, so count them too.
+    ids_size = sum(sys.getsizeof(session_id) for session_id in ids)
+    return (grown + ids_size) / sessions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-session memory benchmark")
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument(
+        "--budget", type=float, default=1536, help="Max bytes per idle session"
+    )
+    args = parser.parse_args()
+    per_session = measure(args.sessions)
+    print(
+        f"{args.sessions} idle sessions: {per_session:.0f} B/session, "
+        f"{per_session * args.sessions / 2**20:.1f} MiB total"
+    )
+    if per_session > args.budget:
+        raise SystemExit(
+            f"over budget: {per_session:.0f} > {args.budget:.0f} B/session"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Measure how long the engine takes to get games back from its journal.
+
+Writes a journal of ``--sessions`` games of ``--steps`` answers each through
+Journal.record, as live traffic would, then times what a restart does with
+it: fold and compact the file at startup, then reattach every game as its
+first request after the restart comes in.
+
+    python bench/recovery.py --sessions 10000 --steps 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from engine import UpstreamState
+from journal import Journal
+
+KEYS = "yn?+-"
+
+
+def _state(rng: random.Random, step: int) -> UpstreamState:
+    return UpstreamState(
+        language="english",
+        theme="characters",
+        child_mode=False,
+        session_id=str(rng.randrange(10**8, 10**9)),
+        signature=str(rng.randrange(10**9, 10**10)),
+        identifiant=uuid.UUID(int=rng.getrandbits(128)).hex[:8],
+        step=step,
+        progression=rng.random() * 100,
+        question=f"Does your character {rng.randrange(2000)} have anything to do with this?",
+        proposition="I think of",
+        step_last_proposition="",
+        win=False,
+        finished=False,
+        completion="OK",
+        id_proposition=None,
+        name_proposition=None,
+        description_proposition=None,
+        flag_photo=0,
+    )
+
+
+def _journal(path: Path) -> Journal:
+    return Journal(
+        path=str(path),
+        state_type=UpstreamState,
+        ttl=3600,
+        flush_interval=3600,
+        compact_bytes=2**62,
+    )
+
+
+async def run(sessions: int, steps: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(sessions)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "journal.log"
+
+        journal = _journal(path)
+        journal.start()
+        written = 0.0
+        for step in range(steps + 1):
+            for session_id in ids:
+                if step == 0:
+                    journal.record(session_id, "start", "en", _state(rng, 0))
+                else:
+                    key = rng.choice(KEYS)
+                    journal.record(session_id, "answer", key, _state(rng, step))
+            start = time.perf_counter()
+            await journal.flush()
+            written += time.perf_counter() - start
+        await journal.aclose()
+        events = sessions * (steps + 1)
+        size = path.stat().st_size
+        print(
+            f"journal   {events} events, {size / 2**20:.1f} MiB, "
+            f"{written / events * 1e6:.1f} us/event to encode and write"
+        )
+
+        journal = _journal(path)
+        start = time.perf_counter()
+        journal.start()
+        startup = time.perf_counter() - start
+        print(
+            f"startup   {startup * 1000:.0f} ms to fold and compact "
+            f"to {path.stat().st_size / 2**20:.1f} MiB, {len(journal)} games"
+        )
+
+        start = time.perf_counter()
+        for session_id in ids:
+            if journal.reattach(session_id) is None:
+                raise SystemExit(f"lost {session_id}")
+        reattach = time.perf_counter() - start
+        print(
+            f"reattach  {reattach / sessions * 1e6:.1f} us/game, "
+            f"{reattach * 1000:.0f} ms for all {sessions}"
+        )
+        print(f"recovery  {(startup + reattach) * 1000:.0f} ms in total")
+        await journal.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Journal recovery benchmark")
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--steps", type=int, default=20, help="Answers per game")
+    args = parser.parse_args()
+    asyncio.run(run(args.sessions, args.steps))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Local stand-in for akinator.com, for benchmarks and load tests.
+
+Speaks the endpoints the ``akinator`` client library calls, under
+``/<lang>/<endpoint>`` so the engine can be pointed at it with
+``AKIN_UPSTREAM_URL=http://127.0.0.1:9000``. It keeps no per-game state:
+everything it needs is in the form fields the client sends back each step.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import uuid
+from dataclasses import dataclass
+from urllib.parse import parse_qs
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, Response
+from starlette.routing import Route
+
+_FIRST_QUESTION = "Is your character real?"
+# One element per line, as on the real page: the client's patterns are greedy.
+_GAME_HTML = (
+    "<html><script>\n"
+    "$('#session').val('{session}');\n"
+    "$('#signature').val('{signature}');\n"
+    "$('#identifiant').val('{identifiant}');\n"
+    "</script>\n"
+    '<div class="bubble-body"><p class="question-text" id="question-label">'
+    f"{_FIRST_QUESTION}</p></div>\n"
+    '<div class="sub-bubble-propose"><p id="p-sub-bubble">I think of</p></div>\n'
+    "</html>\n"
+)
+_CHOICE_HTML = '<span class="win-sentence">Great, guessed right one more time</span>'
+_ERROR_HTML = "A technical problem has ocurred."
+
+
+@dataclass(frozen=True)
+class Profile:
+    """How the stub misbehaves.
+
+    Latency is log-normal around ``latency`` seconds with shape ``jitter``
+    (``0`` makes it constant). The rates are per request: ``error_rate``
+    answers 503, ``timeout_rate`` reports the Akinator session as timed out
+    and ``hang_rate`` waits ``hang`` seconds before answering.
+    """
+
+    latency: float = 0.15
+    jitter: float = 0.5
+    start_latency: float = 0.4
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang: float = 30.0
+    guess_after: tuple[int, int] = (10, 30)
+
+
+def _delay(median: float, jitter: float) -> float:
+    if median <= 0:
+        return 0.0
+    if jitter <= 0:
+        return median
+    return random.lognormvariate(math.log(median), jitter)
+
+
+def _guess_step(session: str, low: int, high: int) -> int:
+    # Stable per game, so retries and prefetched branches agree.
+    digest = hashlib.blake2b(session.encode(), digest_size=4).digest()
+    return low + int.from_bytes(digest) % (high - low + 1)
+
+
+def _question(step: int) -> dict:
+    # The text depends on the step alone, so going back, or answering the
+    # same step again on a speculative branch, shows the question it had.
+    return {
+        "completion": "OK",
+        "akitude": "serein.png",
+        "step": str(step),
+        "progression": f"{min(99.0, step * 3.3):.5f}",
+        "question": _FIRST_QUESTION if step == 0 else f"Question {step + 1}?",
+        "question_id": str(step),
+    }
+
+
+def create_app(profile: Profile) -> Starlette:
+    async def misbehave(median: float) -> Response | None:
+        if random.random() < profile.hang_rate:
+            await asyncio.sleep(profile.hang)
+        else:
+            await asyncio.sleep(_delay(median, profile.jitter))
+        roll = random.random()
+        if roll < profile.error_rate:
+            return HTMLResponse(_ERROR_HTML, status_code=503)
+        if roll < profile.error_rate + profile.timeout_rate:
+            return Response(
+                json.dumps({"completion": "KO - TIMEOUT"}),
+                media_type="application/json",
+            )
+        return None
+
+    async def form(request: Request) -> dict[str, str]:
+        body = (await request.body()).decode()
+        return {k: v[0] for k, v in parse_qs(body, keep_blank_values=True).items()}
+
+    def json_response(data: dict) -> Response:
+        return Response(json.dumps(data), media_type="application/json")
+
+    async def game(request: Request) -> Response:
+        if failed := await misbehave(profile.start_latency):
+            return failed
+        return HTMLResponse(
+            _GAME_HTML.format(
+                session=uuid.uuid4().hex,
+                signature=uuid.uuid4().hex,
+                identifiant=uuid.uuid4().hex[:8],
+            )
+        )
+
+    async def answer(request: Request) -> Response:
+        if failed := await misbehave(profile.latency):
+            return failed
+        data = await form(request)
+        step = int(data["step"]) + 1
+        last = int(data.get("step_last_proposition") or 0)
+        guess_at = _guess_step(data.get("session", ""), *profile.guess_after)
+        if step >= guess_at and step - last >= 5:
+            return json_response(
+                {
+                    "completion": "OK",
+                    "id_proposition": str(guess_at),
+                    "name_proposition": f"Character {guess_at}",
+                    "description_proposition": "Benchmark character",
+                    "pseudo": "bench",
+                    "flag_photo": 0,
+                    "photo": "",
+                }
+            )
+        return json_response(_question(step))
+
+    async def cancel_answer(request: Request) -> Response:
+        if failed := await misbehave(profile.latency):
+            return failed
+        data = await form(request)
+        return json_response(_question(max(0, int(data["step"]) - 1)))
+
+    async def exclude(request: Request) -> Response:
+        if failed := await misbehave(profile.latency):
+            return failed
+        data = await form(request)
+        return json_response(_question(int(data["step"])))
+
+    async def choice(request: Request) -> Response:
+        if failed := await misbehave(profile.latency):
+            return failed
+        return HTMLResponse(_CHOICE_HTML)
+
+    return Starlette(
+        routes=[
+            Route("/{lang}/game", game, methods=["POST"]),
+            Route("/{lang}/answer", answer, methods=["POST"]),
+            Route("/{lang}/cancel_answer", cancel_answer, methods=["POST"]),
+            Route("/{lang}/exclude", exclude, methods=["POST"]),
+            Route("/{lang}/choice", choice, methods=["POST"]),
+        ]
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub Akinator upstream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=Profile.latency)
+    parser.add_argument("--jitter", type=float, default=Profile.jitter)
+    parser.add_argument("--start-latency", type=float, default=Profile.start_latency)
+    parser.add_argument("--error-rate", type=float, default=Profile.error_rate)
+    parser.add_argument("--timeout-rate", type=float, default=Profile.timeout_rate)
+    parser.add_argument("--hang-rate", type=float, default=Profile.hang_rate)
+    parser.add_argument("--hang", type=float, default=Profile.hang)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    profile = Profile(
+        latency=args.latency,
+        jitter=args.jitter,
+        start_latency=args.start_latency,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        hang_rate=args.hang_rate,
+        hang=args.hang,
+    )
+    uvicorn.run(
+        create_app(profile), host=args.host, port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
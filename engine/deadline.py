@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from contextvars import ContextVar
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import requests_abandoned
+
+HEADER = b"request-timeout"
+
+# Event-loop time by which the request being handled must be answered, if any.
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current request's deadline, or None if it has none."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - asyncio.get_running_loop().time()
+
+
+def detach() -> None:
+    """Stop bounding work in this task by the request that spawned it."""
+    _deadline.set(None)
+
+
+def _budget(header: bytes | None, default: float) -> float | None:
+    if header is not None:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            pass
+    return default or None
+
+
+class DeadlineMiddleware:
+    """Stops working on a game request once its client can no longer use the answer.
+
+    A client states how long it will wait in a ``Request-Timeout`` header, in
+    seconds; requests without one get ``default`` (0 for no limit). The
+    deadline is visible to the upstream call policy through :func:`remaining`,
+    and a request still running when it passes is cancelled and answered with
+    ``504 DeadlineExceededError``. A request whose client disconnects is
+    cancelled as well, with nothing left to answer.
+    """
+
+    def __init__(self, app: ASGIApp, default: float = 0.0) -> None:
+        self.app = app
+        self.default = default
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith("/games"):
+            await self.app(scope, receive, send)
+            return
+        budget = _budget(dict(scope["headers"]).get(HEADER), self.default)
+
+        # The body is read up front so that the next message on the real
+        # channel can only be the disconnect.
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        disconnect = asyncio.ensure_future(receive())
+        sent_body = False
+        started = False
+
+        async def receive_body() -> Message:
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await asyncio.shield(disconnect)
+
+        async def send_and_track(message: Message) -> None:
+            nonlocal started
+            started = True
+            await send(message)
+
+        loop = asyncio.get_running_loop()
+        token = _deadline.set(None if budget is None else loop.time() + budget)
+        try:
+            task = asyncio.create_task(self.app(scope, receive_body, send_and_track))
+        finally:
+            _deadline.reset(token)
+        try:
+            done, _ = await asyncio.wait(
+                {task, disconnect}, timeout=budget, return_when=asyncio.FIRST_COMPLETED
+            )
+            if task in done:
+                await task
+                return
+            reason = "disconnect" if disconnect in done else "deadline"
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            requests_abandoned.inc(reason)
+            if reason == "deadline" and not started:
+                await _expired(send, budget or 0.0)
+        finally:
+            task.cancel()
+            disconnect.cancel()
+
+
+async def _expired(send: Send, budget: float) -> None:
+    body = orjson.dumps(
+        {
+            "detail": {
+                "error": "DeadlineExceededError",
+                "message": f"Not answered within the {budget:g}s Request-Timeout",
+            }
+        }
+    )
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -1,21 +1,33 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import sys
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, fields
+from typing import Any, ClassVar, Protocol, Self
 
-from akinator.client import Akinator
 from akinator import exceptions as _aki_exc
-from curl_cffi import requests as _curl_requests
+from akinator.async_client import ANSWER_MAP, LANG_MAP, AsyncAkinator
+from akinator.client import Akinator
 
 from exceptions import (
     CantGoBackError,
+    EngineError,
     InvalidAnswerError,
     InvalidLanguageError,
     NetworkError,
+    SessionTimeoutError,
     StartupError,
 )
+from metrics import upstream_latency
+from resilience import CallPolicy
+from resilience import policy as _default_policy
+from timing import phase
+from transport import UpstreamPool
+from transport import pool as _default_pool
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class GameState:
     question: str
     step: int
@@ -26,6 +38,107 @@ class GameState:
     description_proposition: str | None
 
 
+class GameBackend(Protocol):
+    """What the server plays a game through.
+
+    ``dump`` returns a serializable state (``to_dict``/``from_dict``) of type
+    ``state_type`` that ``restore`` turns back into a live engine, so games
+    can sit in a session store between requests.
+    """
+
+    state_type: ClassVar[type]
+
+    @classmethod
+    def restore(cls, state: Any) -> Self: ...
+
+    def dump(self) -> Any: ...
+
+    def snapshot(self) -> GameState: ...
+
+    async def start_game(self, language: str = "en") -> GameState: ...
+
+    async def answer(self, key: str) -> GameState: ...
+
+    async def back(self) -> GameState: ...
+
+    async def choose(self) -> GameState: ...
+
+    async def exclude(self) -> GameState: ...
+
+
+@dataclass(frozen=True, slots=True)
+class UpstreamState:
+    """Everything needed to resume an upstream game, minus the HTTP session.
+
+    ``cookies`` is the game's own jar; the connection itself comes from
+    whichever pool rehydrates it. Text that recurs across games (questions,
+    guesses, language) is interned, so idle sessions share one copy of it.
+    """
+
+    language: str
+    theme: str
+    child_mode: bool
+    session_id: str
+    signature: str
+    identifiant: str
+    step: int
+    progression: float
+    question: str
+    proposition: str
+    step_last_proposition: int | str
+    win: bool
+    finished: bool
+    completion: str | None
+    id_proposition: str | None
+    name_proposition: str | None
+    description_proposition: str | None
+    flag_photo: Any
+    # Pairs rather than a dict: most games have none, and () is free.
+    cookies: tuple[tuple[str, str], ...] = ()
+
+    def __post_init__(self) -> None:
+        for name in _SHARED_FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, str):
+                object.__setattr__(self, name, sys.intern(value))
+
+    @classmethod
+    def capture(cls, aki: Akinator | AsyncAkinator) -> UpstreamState:
+        values = {f.name: getattr(aki, f.name) for f in _CLIENT_FIELDS}
+        return cls(**values, cookies=_jar(aki.session.cookies))
+
+    def apply(self, aki: Akinator | AsyncAkinator) -> None:
+        for f in _CLIENT_FIELDS:
+            setattr(aki, f.name, getattr(self, f.name))
+        aki.session.cookies.update(dict(self.cookies))
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> UpstreamState:
+        # Older sessions stored cookies as an object, newer ones as pairs.
+        return cls(**{**data, "cookies": _jar(data.get("cookies") or ())})
+
+
+def _jar(cookies: Any) -> tuple[tuple[str, str], ...]:
+    # Every game gets the same few cookie names; only the values differ.
+    return tuple((sys.intern(name), value) for name, value in dict(cookies).items())
+
+
+_CLIENT_FIELDS = tuple(f for f in fields(UpstreamState) if f.name != "cookies")
+_SHARED_FIELDS = (
+    "language",
+    "theme",
+    "question",
+    "proposition",
+    "completion",
+    "id_proposition",
+    "name_proposition",
+    "description_proposition",
+)
+
+
 LANGUAGE_MAP = {
     "en": "english",
     "ar": "arabic",
@@ -45,6 +158,16 @@ LANGUAGE_MAP = {
     "id": "indonesian",
 }
 
+LANGUAGE_CODES = {name: code for code, name in LANGUAGE_MAP.items()}
+# Akinator's own codes differ from ours for a few languages ("cn", "jp").
+_UPSTREAM_NAMES = {code: name for name, code in LANG_MAP.items()}
+
+
+def language_label(language: str) -> str:
+    """Our code for ``language``, a name or Akinator's code, to label metrics."""
+    return LANGUAGE_CODES.get(_UPSTREAM_NAMES.get(language, language), "other")
+
+
 ANSWER_ALIASES = {
     "y": "yes",
     "n": "no",
@@ -54,26 +177,61 @@ ANSWER_ALIASES = {
 }
 
 
-class AkinatorEngine:
-    def __init__(self) -> None:
-        self._aki: Akinator | None = None
+def _upstream_error(e: Exception) -> EngineError:
+    # akinator wraps the upstream "KO - TIMEOUT" reply in a generic RuntimeError
+    cause = e.__cause__
+    if cause is not None and "session has timed out" in str(cause):
+        return SessionTimeoutError(str(cause))
+    return NetworkError(str(e))
+
+
+class _BaseEngine(ABC):
+    state_type = UpstreamState
+
+    def __init__(self, pool: UpstreamPool | None = None) -> None:
+        self._pool = pool or _default_pool
+        self._aki: Akinator | AsyncAkinator | None = None
+
+    @abstractmethod
+    def _new_client(self) -> Akinator | AsyncAkinator: ...
+
+    @classmethod
+    def restore(cls, state: UpstreamState, pool: UpstreamPool | None = None) -> Self:
+        """Rehydrate an engine from a dumped state on top of the pool."""
+        engine = cls(pool)
+        aki = engine._new_client()
+        state.apply(aki)
+        engine._aki = aki
+        return engine
+
+    def dump(self) -> UpstreamState:
+        aki = self._aki
+        if aki is None:
+            raise RuntimeError("engine not started")
+        return UpstreamState.capture(aki)
 
-    def _snapshot(self) -> GameState:
+    def snapshot(self) -> GameState:
         aki = self._aki
         if aki is None:
             raise RuntimeError("engine not started")
         return GameState(
             question=aki.question,
             step=aki.step,
-            progression=aki.progression,
+            # The client sets 0 and 100 as ints; the API always sends a float.
+            progression=float(aki.progression),
             win=aki.win,
             finished=aki.finished,
             name_proposition=getattr(aki, "name_proposition", None),
             description_proposition=getattr(aki, "description_proposition", None),
         )
 
+
+class AkinatorEngine(_BaseEngine):
+    def _new_client(self) -> Akinator:
+        return Akinator(session=self._pool.sync_game_session())
+
     def start_game(self, language: str = "en") -> GameState:
-        aki = Akinator(session=_curl_requests.Session(impersonate="chrome120"))
+        aki = self._new_client()
         language = LANGUAGE_MAP.get(language.lower(), language.lower())
         try:
             aki.start_game(language=language)
@@ -82,7 +240,7 @@ class AkinatorEngine:
         except Exception as e:
             raise StartupError(str(e)) from e
         self._aki = aki
-        return self._snapshot()
+        return self.snapshot()
 
     def answer(self, key: str) -> GameState:
         aki = self._aki
@@ -94,8 +252,8 @@ class AkinatorEngine:
         except _aki_exc.InvalidChoiceError as e:
             raise InvalidAnswerError(str(e)) from e
         except Exception as e:
-            raise NetworkError(str(e)) from e
-        return self._snapshot()
+            raise _upstream_error(e) from e
+        return self.snapshot()
 
     def back(self) -> GameState:
         aki = self._aki
@@ -106,8 +264,8 @@ class AkinatorEngine:
         except _aki_exc.CantGoBackAnyFurther as e:
             raise CantGoBackError(str(e)) from e
         except Exception as e:
-            raise NetworkError(str(e)) from e
-        return self._snapshot()
+            raise _upstream_error(e) from e
+        return self.snapshot()
 
     def choose(self) -> GameState:
         aki = self._aki
@@ -116,8 +274,8 @@ class AkinatorEngine:
         try:
             aki.choose()
         except Exception as e:
-            raise NetworkError(str(e)) from e
-        return self._snapshot()
+            raise _upstream_error(e) from e
+        return self.snapshot()
 
     def exclude(self) -> GameState:
         aki = self._aki
@@ -126,5 +284,127 @@ class AkinatorEngine:
         try:
             aki.exclude()
         except Exception as e:
-            raise NetworkError(str(e)) from e
-        return self._snapshot()
+            raise _upstream_error(e) from e
+        return self.snapshot()
+
+
+class AsyncAkinatorEngine(_BaseEngine):
+    """Non-blocking twin of AkinatorEngine, driven by the shared async pool.
+
+    Every upstream call runs on a fresh client forked from the current state
+    and is only adopted once it succeeds, so retries and hedged attempts
+    (see CallPolicy) never see each other's half-applied changes.
+    """
+
+    def __init__(
+        self, pool: UpstreamPool | None = None, policy: CallPolicy | None = None
+    ) -> None:
+        super().__init__(pool)
+        self._policy = policy or _default_policy
+
+    def _new_client(self) -> AsyncAkinator:
+        return AsyncAkinator(session=self._pool.game_session())
+
+    async def _forked(
+        self,
+        op: str,
+        call: Callable[[AsyncAkinator], Awaitable[None]],
+        step_delta: int | None = None,
+    ) -> GameState:
+        origin = self.dump()
+
+        async def attempt() -> AsyncAkinator:
+            aki = self._new_client()
+            origin.apply(aki)
+            with (
+                phase("upstream"),
+                upstream_latency.timer(op, language_label(origin.language)),
+            ):
+                await call(aki)
+            return aki
+
+        def validate(aki: AsyncAkinator) -> None:
+            # A retried request the upstream had already applied shows up as
+            # a skipped step; surface it rather than silently skip a question.
+            if step_delta is None or aki.win or aki.finished:
+                return
+            if aki.step != origin.step + step_delta:
+                raise NetworkError(
+                    f"Upstream moved to step {aki.step} instead of "
+                    f"{origin.step + step_delta} after a retried {op}"
+                )
+
+        self._aki = await self._policy.run(op, attempt, validate=validate)
+        return self.snapshot()
+
+    async def start_game(self, language: str = "en") -> GameState:
+        language = LANGUAGE_MAP.get(language.lower(), language.lower())
+
+        async def attempt() -> AsyncAkinator:
+            aki = self._new_client()
+            try:
+                with (
+                    phase("upstream"),
+                    upstream_latency.timer("start", language_label(language)),
+                ):
+                    await aki.start_game(language=language)
+            except _aki_exc.InvalidLanguageError as e:
+                raise InvalidLanguageError(str(e)) from e
+            except Exception as e:
+                raise StartupError(str(e)) from e
+            return aki
+
+        self._aki = await self._policy.run("start", attempt, transient=StartupError)
+        return self.snapshot()
+
+    async def answer(self, key: str) -> GameState:
+        answer_str = ANSWER_ALIASES.get(key, key)
+        if self._aki is not None and self._aki.win:
+            # The client quietly turns yes/no on a guess into choose/exclude;
+            # do it here so the policy sees the real op and never retries a
+            # choose.
+            answer_id = ANSWER_MAP.get(answer_str.lower())
+            if answer_id == 0:
+                return await self.choose()
+            if answer_id == 1:
+                return await self.exclude()
+            raise InvalidAnswerError("Only yes or no can answer a guess")
+
+        async def call(aki: AsyncAkinator) -> None:
+            try:
+                await aki.answer(answer_str)
+            except _aki_exc.InvalidChoiceError as e:
+                raise InvalidAnswerError(str(e)) from e
+            except Exception as e:
+                raise _upstream_error(e) from e
+
+        return await self._forked("answer", call, step_delta=1)
+
+    async def back(self) -> GameState:
+        async def call(aki: AsyncAkinator) -> None:
+            try:
+                await aki.back()
+            except _aki_exc.CantGoBackAnyFurther as e:
+                raise CantGoBackError(str(e)) from e
+            except Exception as e:
+                raise _upstream_error(e) from e
+
+        return await self._forked("back", call, step_delta=-1)
+
+    async def choose(self) -> GameState:
+        async def call(aki: AsyncAkinator) -> None:
+            try:
+                await aki.choose()
+            except Exception as e:
+                raise _upstream_error(e) from e
+
+        return await self._forked("choose", call)
+
+    async def exclude(self) -> GameState:
+        async def call(aki: AsyncAkinator) -> None:
+            try:
+                await aki.exclude()
+            except Exception as e:
+                raise _upstream_error(e) from e
+
+        return await self._forked("exclude", call)
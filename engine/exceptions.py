@@ -17,3 +17,16 @@ class SessionTimeoutError(EngineError): ...
 
 
 class NetworkError(EngineError): ...
+
+
+class UpstreamUnavailableError(EngineError): ...
+
+
+class OverloadedError(EngineError):
+    def __init__(self, message: str, retry_after: float = 1.0) -> None:
+        super().__init__(message)
+        # Seconds the client should wait before trying again.
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(EngineError): ...
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import idempotent_replays
+from timing import phase
+
+HEADER = b"idempotency-key"
+
+
+class _Response:
+    __slots__ = ("body", "headers", "request_body", "status")
+
+    def __init__(self, request_body: bytes) -> None:
+        self.request_body = request_body
+        self.status = 500
+        self.headers: list[tuple[bytes, bytes]] = []
+        self.body = b""
+
+
+class IdempotencyCache:
+    """Responses to mutating game requests, by path and ``Idempotency-Key``.
+
+    A request whose key is in flight waits for the original and gets its
+    response; one whose key has completed gets the stored response back, for
+    ``ttl`` seconds and up to ``capacity`` keys. Failures the client should
+    retry (5xx and 429) are not stored.
+    """
+
+    def __init__(self, capacity: int, ttl: float) -> None:
+        self.capacity = capacity
+        self._ttl = ttl
+        self._done: OrderedDict[tuple[str, bytes], tuple[float, _Response]] = (
+            OrderedDict()
+        )
+        self._in_flight: dict[tuple[str, bytes], asyncio.Future[_Response | None]] = {}
+        self.conflicts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "stored": len(self._done),
+            "in_flight": len(self._in_flight),
+            "conflicts": self.conflicts,
+        }
+
+    def _lookup(self, key: tuple[str, bytes]) -> _Response | None:
+        hit = self._done.get(key)
+        if hit is None:
+            return None
+        expires_at, response = hit
+        if expires_at < time.monotonic():
+            del self._done[key]
+            return None
+        return response
+
+    def _store(self, key: tuple[str, bytes], response: _Response) -> None:
+        if response.status >= 500 or response.status == 429:
+            return
+        self._done[key] = (time.monotonic() + self._ttl, response)
+        self._done.move_to_end(key)
+        while len(self._done) > self.capacity:
+            self._done.popitem(last=False)
+
+
+class IdempotencyMiddleware:
+    """Applies an IdempotencyCache to ``POST /games...`` with the header set."""
+
+    def __init__(self, app: ASGIApp, cache: IdempotencyCache) -> None:
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        idempotency_key = None
+        if (
+            scope["type"] == "http"
+            and scope["method"] == "POST"
+            and scope["path"].startswith("/games")
+            and self.cache.enabled
+        ):
+            idempotency_key = dict(scope["headers"]).get(HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        cache = self.cache
+        key = (scope["path"], idempotency_key)
+
+        response = cache._lookup(key)
+        if response is None and (original := cache._in_flight.get(key)) is not None:
+            with phase("wait"):
+                response = await asyncio.shield(original)
+            how = "in_flight"
+        else:
+            how = "stored"
+        if response is not None:
+            if response.request_body != body:
+                cache.conflicts += 1
+                await _conflict(send)
+                return
+            idempotent_replays.inc(how)
+            await _replay(response, send)
+            return
+
+        future: asyncio.Future[_Response | None] = (
+            asyncio.get_running_loop().create_future()
+        )
+        cache._in_flight[key] = future
+        captured = _Response(body)
+        sent_body = False
+
+        async def receive_body() -> Message:
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def send_and_capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                captured.status = message["status"]
+                captured.headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                captured.body += message.get("body", b"")
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_and_capture)
+        except BaseException:
+            # Duplicates waiting on this one run the request themselves.
+            future.set_result(None)
+            raise
+        else:
+            future.set_result(captured)
+            cache._store(key, captured)
+        finally:
+            if cache._in_flight.get(key) is future:
+                del cache._in_flight[key]
+
+
+async def _replay(response: _Response, send: Send) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status,
+            "headers": [*response.headers, (b"idempotent-replayed", b"true")],
+        }
+    )
+    await send({"type": "http.response.body", "body": response.body})
+
+
+async def _conflict(send: Send) -> None:
+    body = orjson.dumps(
+        {
+            "detail": {
+                "error": "IdempotencyKeyReused",
+                "message": "Idempotency-Key was already used with a different body",
+            }
+        }
+    )
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 422,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from engine import GameBackend
+from metrics import journal_flush_latency, journal_recoveries
+from settings import Settings
+from store import StoredState
+
+logger = logging.getLogger(__name__)
+
+
+class _Game:
+    """What the journal knows about one game: enough to reattach or replay it."""
+
+    __slots__ = ("language", "ops", "state", "updated_at")
+
+    def __init__(
+        self,
+        language: str,
+        ops: list[list[str | None]],
+        state: bytes,
+        updated_at: float,
+    ) -> None:
+        self.language = language
+        self.ops = ops
+        self.state = state
+        self.updated_at = updated_at
+
+
+# Each line is a JSON object whose last member is the state. Values before it
+# are escaped JSON, so the first occurrence is the real one.
+_STATE = b',"st":'
+
+
+def _line(head: dict[str, Any], state: bytes) -> bytes:
+    return orjson.dumps(head)[:-1] + _STATE + state + b"}\n"
+
+
+def fold(
+    path: Path,
+    state_type: type[StoredState],
+    ttl: float,
+    now: float | None = None,
+) -> dict[str, _Game]:
+    """Every game in the journal at ``path`` that is neither over nor expired.
+
+    Only the head of each line is parsed; a state is kept as raw JSON, and
+    only the last one of each unexpired game is ever decoded, as a
+    ``state_type``, to see whether it is over. A torn last line, from a crash
+    mid-write, is skipped.
+    """
+    cutoff = (time.time() if now is None else now) - ttl
+    games: dict[str, _Game] = {}
+    try:
+        f = path.open("rb")
+    except FileNotFoundError:
+        return games
+    with f:
+        for line in f:
+            split = line.find(_STATE)
+            if split < 0 or not line.endswith(b"}\n"):
+                continue
+            try:
+                event = orjson.loads(line[:split] + b"}")
+            except orjson.JSONDecodeError:
+                continue
+            session_id, op = event["s"], event["op"]
+            state = line[split + len(_STATE) : -2]
+            if op == "start":
+                games[session_id] = _Game(event["k"], [], state, event["t"])
+            elif op == "snapshot":
+                games[session_id] = _Game(event["k"], event["ops"], state, event["t"])
+            elif (game := games.get(session_id)) is not None:
+                game.ops.append([op, event["k"]])
+                game.state = state
+                game.updated_at = event["t"]
+    return {
+        session_id: game
+        for session_id, game in games.items()
+        if game.updated_at > cutoff
+        and not state_type.from_dict(orjson.loads(game.state)).finished
+    }
+
+
+class Journal:
+    """Append-only log of game events, so a restarted engine can resume games.
+
+    ``record`` only queues an event; a background task writes everything
+    queued in one ``write`` and ``fsync`` every ``flush_interval`` seconds, so
+    a crash loses at most that much. Each event carries the state the game
+    was left in, and on startup the file is folded into one ``snapshot`` per
+    live game. A game asked for after a restart is reattached from its last
+    state, or, if its upstream session has gone, replayed from its recorded
+    steps on a fresh one. The file is compacted the same way whenever it has
+    grown by ``compact_bytes``.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        state_type: type[StoredState],
+        ttl: float,
+        flush_interval: float,
+        compact_bytes: int,
+    ) -> None:
+        self.path = Path(path)
+        self._state_type = state_type
+        self._ttl = ttl
+        self._flush_interval = flush_interval
+        self._compact_bytes = compact_bytes
+        self._pending: list[tuple[str, float, str, str | None, Any]] = []
+        self._fd: int | None = None
+        self._written = 0
+        self._writer: asyncio.Task | None = None
+        # Games from before the restart not yet asked for, and ones
+        # reattached but not yet known to still be alive upstream.
+        self._recovered: dict[str, _Game] = {}
+        self._reattached: dict[str, _Game] = {}
+        self.events = 0
+        self.flushes = 0
+        self.compactions = 0
+
+    def __len__(self) -> int:
+        return len(self._recovered)
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "bytes": self.path.stat().st_size if self.path.exists() else 0,
+            "events": self.events,
+            "flushes": self.flushes,
+            "compactions": self.compactions,
+            "recoverable": len(self._recovered),
+        }
+
+    def record(
+        self, session_id: str, op: str, key: str | None, state: StoredState
+    ) -> None:
+        """Queue ``op`` (with its answer key, or language for ``start``)."""
+        self._reattached.pop(session_id, None)
+        self._recovered.pop(session_id, None)
+        self._pending.append((session_id, time.time(), op, key, state))
+
+    def reattach(self, session_id: str) -> StoredState | None:
+        """The last recorded state of a game from before the restart."""
+        game = self._recovered.pop(session_id, None)
+        if game is None:
+            return None
+        self._reattached[session_id] = game
+        journal_recoveries.inc("reattach")
+        return self._state_type.from_dict(orjson.loads(game.state))
+
+    async def replay(self, session_id: str, engine: GameBackend) -> bool:
+        """Rebuild a reattached game on ``engine`` from its recorded steps.
+
+        Returns False if the game wasn't reattached from the journal.
+        """
+        game = self._reattached.pop(session_id, None)
+        if game is None:
+            return False
+        await engine.start_game(game.language)
+        for op, key in game.ops:
+            if op == "answer":
+                await engine.answer(key or "")
+            else:
+                await getattr(engine, op)()
+        journal_recoveries.inc("replay")
+        self._pending.append(
+            (
+                session_id,
+                time.time(),
+                "snapshot",
+                game.language,
+                (game.ops, engine.dump()),
+            )
+        )
+        return True
+
+    def _encode(self, event: tuple[str, float, str, str | None, Any]) -> bytes:
+        session_id, at, op, key, state = event
+        head = {"s": session_id, "t": at, "op": op, "k": key}
+        if op == "snapshot":
+            head["ops"], state = state
+        # orjson encodes the state dataclasses natively, to the same JSON as
+        # to_dict, without asdict's deep copy.
+        return _line(head, orjson.dumps(state))
+
+    def _open(self) -> None:
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _compact(self, games: dict[str, _Game] | None = None) -> dict[str, _Game]:
+        """Rewrite the file as one snapshot per live game, and return those."""
+        if games is None:
+            games = fold(self.path, self._state_type, self._ttl)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("wb") as f:
+            for session_id, game in games.items():
+                head = {
+                    "s": session_id,
+                    "t": game.updated_at,
+                    "op": "snapshot",
+                    "k": game.language,
+                    "ops": game.ops,
+                }
+                f.write(_line(head, game.state))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        if self._fd is not None:
+            os.close(self._fd)
+        self._open()
+        self._written = 0
+        self.compactions += 1
+        return games
+
+    def start(self) -> None:
+        """Load the games left in the journal, compact it, and start writing."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._recovered = self._compact(fold(self.path, self._state_type, self._ttl))
+        if self._recovered:
+            logger.info("%d games recoverable from the journal", len(self._recovered))
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_forever())
+
+    def _write(self, data: bytes) -> None:
+        assert self._fd is not None
+        end = os.fstat(self._fd).st_size
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view) :]
+            os.fsync(self._fd)
+        except OSError:
+            # flush() writes the whole batch again, so leave none of it behind.
+            with contextlib.suppress(OSError):
+                os.ftruncate(self._fd, end)
+            raise
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        data = b"".join(map(self._encode, pending))
+        try:
+            with journal_flush_latency.timer():
+                await asyncio.to_thread(self._write, data)
+        except OSError:
+            # Keep the batch, ahead of anything recorded meanwhile, for the
+            # next flush.
+            self._pending = pending + self._pending
+            raise
+        self.events += len(pending)
+        self.flushes += 1
+        self._written += len(data)
+        if self._written >= self._compact_bytes:
+            live = await asyncio.to_thread(self._compact)
+            # Forget recovered games that have expired since the restart.
+            for games in (self._recovered, self._reattached):
+                for session_id in games.keys() - live.keys():
+                    del games[session_id]
+
+    async def _write_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except OSError:
+                logger.exception("Could not write the journal")
+
+    async def aclose(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._writer
+            self._writer = None
+        with contextlib.suppress(OSError):
+            await self.flush()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def make_journal(settings: Settings, state_type: type[StoredState]) -> Journal | None:
+    if not settings.journal_path:
+        return None
+    path = settings.journal_path
+    if settings.shard >= 0:
+        # Each shard only ever recovers its own games.
+        path = f"{path}.{settings.shard}"
+    return Journal(
+        path=path,
+        state_type=state_type,
+        ttl=settings.session_ttl,
+        flush_interval=settings.journal_flush_interval,
+        compact_bytes=settings.journal_compact_bytes,
+    )
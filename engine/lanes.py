@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections import deque
+
+from exceptions import OverloadedError
+from metrics import session_queue_wait
+from timing import phase
+
+
+class _Lane:
+    __slots__ = ("waiters",)
+
+    def __init__(self) -> None:
+        # Commands waiting their turn, each with when it arrived. The lane
+        # exists only while some command holds it.
+        self.waiters: deque[tuple[asyncio.Future[None], float]] = deque()
+
+
+class _Turn:
+    # A plain class rather than @asynccontextmanager: it wraps every game
+    # command.
+    __slots__ = ("_lanes", "_session_id")
+
+    def __init__(self, lanes: SessionLanes, session_id: str) -> None:
+        self._lanes = lanes
+        self._session_id = session_id
+
+    async def __aenter__(self) -> None:
+        await self._lanes._acquire(self._session_id)
+
+    async def __aexit__(self, *exc: object) -> None:
+        self._lanes._release(self._session_id)
+
+
+class SessionLanes:
+    """One ordered command queue per game.
+
+    Commands for the same session run one at a time, in the order they
+    arrived, so a client may pipeline them without waiting for each reply.
+    Commands for different sessions never wait on each other. A session with
+    ``max_depth`` commands already waiting turns new ones away with
+    ``OverloadedError``. Only commands in this process are ordered, which
+    covers every game unless ``AKIN_WORKERS`` share a store.
+    """
+
+    def __init__(self, max_depth: int) -> None:
+        self._max_depth = max_depth
+        self._lanes: dict[str, _Lane] = {}
+        self.queued = 0
+        self.rejected = 0
+
+    def turn(self, session_id: str) -> _Turn:
+        """``async with`` this to run a command on ``session_id`` in its turn."""
+        return _Turn(self, session_id)
+
+    @property
+    def waiting(self) -> int:
+        """Commands waiting for an earlier one on the same game."""
+        return sum(len(lane.waiters) for lane in self._lanes.values())
+
+    def stats(self, top: int = 10) -> dict:
+        now = time.perf_counter()
+        busiest = sorted(
+            ((sid, lane) for sid, lane in self._lanes.items() if lane.waiters),
+            key=lambda item: len(item[1].waiters),
+            reverse=True,
+        )[:top]
+        return {
+            "busy": len(self._lanes),
+            "waiting": self.waiting,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "deepest": {
+                session_id: {
+                    "depth": 1 + len(lane.waiters),
+                    "oldest_wait": round(now - lane.waiters[0][1], 3),
+                }
+                for session_id, lane in busiest
+            },
+        }
+
+    async def _acquire(self, session_id: str) -> None:
+        lane = self._lanes.get(session_id)
+        if lane is None:
+            self._lanes[session_id] = _Lane()
+            return
+        if len(lane.waiters) >= self._max_depth:
+            self.rejected += 1
+            raise OverloadedError(
+                f"{self._max_depth} commands already queued for this game"
+            )
+        self.queued += 1
+        turn = asyncio.get_running_loop().create_future()
+        arrived = time.perf_counter()
+        lane.waiters.append((turn, arrived))
+        try:
+            with phase("wait"):
+                await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled():
+                # Handed the lane just as this command gave up: pass it on.
+                self._release(session_id)
+            else:
+                # Unless _release already skipped over it.
+                with contextlib.suppress(ValueError):
+                    lane.waiters.remove((turn, arrived))
+            raise
+        finally:
+            session_queue_wait.observe(time.perf_counter() - arrived)
+
+    def _release(self, session_id: str) -> None:
+        lane = self._lanes[session_id]
+        while lane.waiters:
+            turn, _ = lane.waiters.popleft()
+            if not turn.done():
+                turn.set_result(None)
+                return
+        del self._lanes[session_id]
@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import functools
+import json
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Any, Self
+
+import numpy as np
+
+from engine import ANSWER_ALIASES, LANGUAGE_CODES, LANGUAGE_MAP, GameState
+from exceptions import (
+    CantGoBackError,
+    InvalidAnswerError,
+    InvalidLanguageError,
+    StartupError,
+)
+from settings import settings
+
+# P(yes) for each letter of a character's answer string in the JSON format.
+_LEVELS = {"y": 0.95, "p": 0.75, "?": 0.5, "q": 0.25, "n": 0.05}
+
+# Likelihood of each answer given p = P(yes | character) is A + B * p, in the
+# order yes, no, don't know, probably, probably not.
+_ANSWERS = ("yes", "no", "idk", "probably", "probably not")
+_A = np.array([0.0, 1.0, 1.0, 0.25, 0.75], dtype=np.float32)
+_B = np.array([1.0, -1.0, 0.0, 0.5, -0.5], dtype=np.float32)
+_ANSWER_INDEX = {
+    **{name: i for i, name in enumerate(_ANSWERS)},
+    **{key: _ANSWERS.index(name) for key, name in ANSWER_ALIASES.items()},
+}
+
+# Information gain is only scored over the most likely characters.
+_CANDIDATES = 256
+
+
+def _entropy(p: np.ndarray, axis: int = 0) -> np.ndarray:
+    return -(p * np.log(np.where(p > 0, p, 1.0))).sum(axis=axis)
+
+
+class CharacterMatrix:
+    """Characters × questions table of P(yes), plus the text to show for each.
+
+    Loaded from a ``.npz`` file (``yes`` quantized to uint8) or, for small
+    hand-written sets, from the JSON format in ``data/characters.json``.
+    """
+
+    def __init__(
+        self,
+        language: str,
+        names: list[str],
+        descriptions: list[str],
+        questions: list[str],
+        yes: np.ndarray,
+    ) -> None:
+        if yes.shape != (len(names), len(questions)):
+            raise ValueError(
+                f"Matrix is {yes.shape}, expected {len(names)}×{len(questions)}"
+            )
+        self.language = language
+        self.names = names
+        self.descriptions = descriptions
+        self.questions = questions
+        self.yes = np.clip(yes.astype(np.float32), 0.02, 0.98)
+
+    @classmethod
+    def load(cls, path: str | Path) -> CharacterMatrix:
+        path = Path(path)
+        if path.suffix == ".json":
+            return cls.from_json(json.loads(path.read_text(encoding="utf-8")))
+        with np.load(path) as data:
+            return cls(
+                language=str(data["language"]),
+                names=data["names"].tolist(),
+                descriptions=data["descriptions"].tolist(),
+                questions=data["questions"].tolist(),
+                yes=data["yes"] / 255,
+            )
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> CharacterMatrix:
+        characters = data["characters"]
+        return cls(
+            language=data["language"],
+            names=[c["name"] for c in characters],
+            descriptions=[c["description"] for c in characters],
+            questions=data["questions"],
+            yes=np.array(
+                [[_LEVELS[a] for a in c["answers"]] for c in characters],
+                dtype=np.float32,
+            ),
+        )
+
+    def save(self, path: str | Path) -> None:
+        np.savez_compressed(
+            path,
+            language=np.array(self.language),
+            names=np.array(self.names),
+            descriptions=np.array(self.descriptions),
+            questions=np.array(self.questions),
+            yes=np.round(self.yes * 255).astype(np.uint8),
+        )
+
+    def posterior(
+        self, answers: tuple[tuple[int, int], ...], excluded: tuple[int, ...]
+    ) -> np.ndarray:
+        """P(character | answers) from a uniform prior, excluded ones at zero."""
+        log_post = np.zeros(len(self.names), dtype=np.float32)
+        if answers:
+            questions, given = np.array(answers).T
+            likelihood = _A[given] + _B[given] * self.yes[:, questions]
+            log_post += np.log(likelihood).sum(axis=1)
+        if excluded:
+            log_post[list(excluded)] = -np.inf
+        if np.isneginf(log_post).all():
+            return np.zeros_like(log_post)
+        post = np.exp(log_post - log_post.max())
+        return post / post.sum()
+
+    def best_question(self, post: np.ndarray, asked: set[int]) -> int | None:
+        """The unasked question whose yes/no answer is expected to tell most."""
+        if len(asked) >= len(self.questions):
+            return None
+        top = post.nonzero()[0]
+        if len(top) > _CANDIDATES:
+            top = top[np.argpartition(post[top], -_CANDIDATES)[-_CANDIDATES:]]
+        weights = post[top] / post[top].sum()
+        yes = self.yes[top]
+        p_yes = weights @ yes
+        after_yes = weights[:, None] * yes / p_yes
+        after_no = weights[:, None] * (1 - yes) / (1 - p_yes)
+        expected = p_yes * _entropy(after_yes) + (1 - p_yes) * _entropy(after_no)
+        expected[list(asked)] = np.inf
+        return int(expected.argmin())
+
+
+@functools.cache
+def default_matrix() -> CharacterMatrix:
+    return CharacterMatrix.load(Path(__file__).parent / settings.local_data)
+
+
+@dataclass(frozen=True, slots=True)
+class LocalState:
+    """A local game: just the answers given and guesses rejected so far."""
+
+    language: str
+    answers: tuple[tuple[int, int], ...] = ()
+    excluded: tuple[int, ...] = ()
+    guess: int | None = None
+    finished: bool = False
+
+    @property
+    def step(self) -> int:
+        return len(self.answers)
+
+    @property
+    def win(self) -> bool:
+        return self.guess is not None
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> LocalState:
+        return cls(
+            language=data["language"],
+            answers=tuple((q, a) for q, a in data["answers"]),
+            excluded=tuple(data["excluded"]),
+            guess=data["guess"],
+            finished=data["finished"],
+        )
+
+
+class LocalEngine:
+    """Plays Akinator's game against a local CharacterMatrix, no network.
+
+    Each answer multiplies the posterior over characters by its likelihood.
+    The next question is the one with the lowest expected posterior entropy,
+    and a guess is made once one character passes ``local_guess_threshold``
+    or the question budget runs out. Each wrong guess buys five more
+    questions, up to ``local_max_guesses`` guesses.
+    """
+
+    state_type = LocalState
+
+    def __init__(self, matrix: CharacterMatrix | None = None) -> None:
+        self._matrix = matrix or default_matrix()
+        self._state: LocalState | None = None
+        self._post: np.ndarray | None = None
+        self._question: int | None = None
+
+    @classmethod
+    def restore(cls, state: LocalState, matrix: CharacterMatrix | None = None) -> Self:
+        engine = cls(matrix)
+        engine._set(state)
+        return engine
+
+    def dump(self) -> LocalState:
+        if self._state is None:
+            raise RuntimeError("engine not started")
+        return self._state
+
+    def _set(self, state: LocalState) -> None:
+        self._state = state
+        self._post = self._matrix.posterior(state.answers, state.excluded)
+        self._question = None
+        if state.finished or state.win:
+            return
+        asked = {q for q, _ in state.answers}
+        budget = settings.local_max_questions + 5 * len(state.excluded)
+        confident = self._post.max() >= settings.local_guess_threshold
+        if not confident and state.step < budget:
+            self._question = self._matrix.best_question(self._post, asked)
+        if self._question is not None:
+            return
+        if len(state.excluded) >= settings.local_max_guesses or not self._post.any():
+            self._set(replace(state, finished=True))
+        else:
+            guess = int(self._post.argmax())
+            self._state = replace(state, guess=guess)
+
+    def snapshot(self) -> GameState:
+        state = self.dump()
+        matrix = self._matrix
+        if self._question is not None:
+            question = matrix.questions[self._question]
+        elif state.answers:
+            question = matrix.questions[state.answers[-1][0]]
+        else:
+            question = ""
+        return GameState(
+            question=question,
+            step=state.step,
+            progression=100.0 if state.finished else float(self._post.max()) * 100,
+            win=state.win,
+            finished=state.finished,
+            name_proposition=matrix.names[state.guess] if state.win else None,
+            description_proposition=(
+                matrix.descriptions[state.guess] if state.win else None
+            ),
+        )
+
+    async def start_game(self, language: str = "en") -> GameState:
+        code = language.lower()
+        code = code if code in LANGUAGE_MAP else LANGUAGE_CODES.get(code, code)
+        if code != self._matrix.language:
+            raise InvalidLanguageError(
+                f"Unsupported language: {language}. "
+                f"The local backend only has {self._matrix.language!r}"
+            )
+        self._set(LocalState(language=code))
+        if self._question is None and not self.dump().win:
+            raise StartupError("The local character set has no questions")
+        return self.snapshot()
+
+    async def answer(self, key: str) -> GameState:
+        state = self.dump()
+        index = _ANSWER_INDEX.get(key.lower())
+        if index is None:
+            raise InvalidAnswerError(
+                f"Invalid answer: {key}. Valid answers are: {', '.join(_ANSWER_INDEX)}"
+            )
+        if state.finished:
+            raise InvalidAnswerError("The game is over")
+        if state.win:
+            # Same as the akinator client: yes/no to a guess picks or rejects it.
+            if _ANSWERS[index] == "yes":
+                return await self.choose()
+            if _ANSWERS[index] == "no":
+                return await self.exclude()
+            raise InvalidAnswerError("Only yes or no can answer a guess")
+        assert self._question is not None
+        self._set(replace(state, answers=(*state.answers, (self._question, index))))
+        return self.snapshot()
+
+    async def back(self) -> GameState:
+        state = self.dump()
+        if state.finished or not state.answers:
+            raise CantGoBackError("Can't go back any further")
+        self._set(
+            LocalState(
+                language=state.language,
+                answers=state.answers[:-1],
+                excluded=state.excluded,
+            )
+        )
+        return self.snapshot()
+
+    async def choose(self) -> GameState:
+        state = self.dump()
+        if not state.win or state.finished:
+            raise InvalidAnswerError("There is no guess to accept")
+        self._set(replace(state, finished=True))
+        return self.snapshot()
+
+    async def exclude(self) -> GameState:
+        state = self.dump()
+        if not state.win or state.finished:
+            raise InvalidAnswerError("There is no guess to reject")
+        self._set(
+            LocalState(
+                language=state.language,
+                answers=state.answers,
+                excluded=(*state.excluded, state.guess),
+            )
+        )
+        return self.snapshot()
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import TypeVar
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STEP_BUCKETS = (5, 10, 15, 20, 25, 30, 40, 50, 60, 80)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+M = TypeVar("M", bound="_Metric")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], **extra: str) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind: str
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    @abstractmethod
+    def _samples(self) -> Iterator[str]: ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Gauge(_Metric):
+    """A value read from ``fn`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]) -> None:
+        super().__init__(name, help)
+        self._fn = fn
+
+    def _samples(self) -> Iterator[str]:
+        yield f"{self.name} {_number(self._fn())}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self._buckets = buckets
+        # Per label set: [count per bucket..., count above the last, sum]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        row = self._values.get(labels)
+        if row is None:
+            row = self._values[labels] = [0] * (len(self._buckets) + 2)
+        row[bisect_left(self._buckets, value)] += 1
+        row[-1] += value
+
+    @contextmanager
+    def timer(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _samples(self) -> Iterator[str]:
+        for labels, row in self._values.items():
+            cumulative = 0
+            for le, count in zip((*self._buckets, float("inf")), row):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket"
+                    f"{_labels(self.labels, labels, le=_number(le))} {cumulative}"
+                )
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(row[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    """Metrics served at ``GET /metrics`` in Prometheus text format.
+
+    Everything is recorded from the event loop, so recording is a dict lookup
+    and an add with no locking. Label values are passed positionally, in the
+    order the label names were declared.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name!r} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help, fn))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+upstream_latency = registry.histogram(
+    "akin_upstream_latency_seconds",
+    "Duration of single upstream Akinator calls",
+    labels=("op", "language"),
+)
+engine_errors = registry.counter(
+    "akin_engine_errors_total",
+    "Engine errors returned to clients, by error type",
+    labels=("error",),
+)
+game_steps = registry.histogram(
+    "akin_game_steps",
+    "Questions asked before a game finished",
+    labels=("outcome",),
+    buckets=STEP_BUCKETS,
+)
+session_hibernations = registry.counter(
+    "akin_session_hibernations_total", "Idle sessions moved out of memory"
+)
+session_rehydrations = registry.counter(
+    "akin_session_rehydrations_total", "Hibernated sessions loaded back on use"
+)
+session_rehydrate_latency = registry.histogram(
+    "akin_session_rehydrate_seconds",
+    "Time to load a hibernated session back into memory",
+    buckets=FAST_BUCKETS,
+)
+journal_recoveries = registry.counter(
+    "akin_journal_recoveries_total",
+    "Games resumed from the journal after a restart",
+    ("how",),
+)
+idempotent_replays = registry.counter(
+    "akin_idempotent_replays_total",
+    "Requests answered with an earlier response to the same Idempotency-Key",
+    ("how",),
+)
+requests_abandoned = registry.counter(
+    "akin_requests_abandoned_total",
+    "Requests cancelled because their client had given up on them",
+    ("reason",),
+)
+upstream_abandoned = registry.counter(
+    "akin_upstream_abandoned_total",
+    "Upstream attempts skipped or cut short at their request's deadline",
+    ("op", "how"),
+)
+upstream_quota_rejections = registry.counter(
+    "akin_upstream_quota_rejections_total",
+    "Upstream calls turned away by the upstream rate budget",
+    ("how",),
+)
+upstream_quota_wait = registry.histogram(
+    "akin_upstream_quota_wait_seconds",
+    "Time upstream calls queued for the global upstream rate budget",
+    ("priority",),
+)
+session_queue_wait = registry.histogram(
+    "akin_session_queue_wait_seconds",
+    "Time a command waited for earlier commands on the same game",
+)
+journal_flush_latency = registry.histogram(
+    "akin_journal_flush_seconds",
+    "Time to write and fsync one batch of journal events",
+    buckets=FAST_BUCKETS,
+)
@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import sys
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Self
+
+from engine import (
+    ANSWER_ALIASES,
+    LANGUAGE_MAP,
+    AsyncAkinatorEngine,
+    GameState,
+    UpstreamState,
+)
+from exceptions import CantGoBackError, InvalidAnswerError
+from settings import settings
+
+# A path has one character per step since the start: the answer key, or one
+# of these for what the player did with a guess.
+EXCLUDE = "x"
+CHOOSE = "c"
+
+_KEY_FOR_ANSWER = {answer: key for key, answer in ANSWER_ALIASES.items()}
+
+
+def _same(a: GameState, b: GameState) -> bool:
+    # Progression is a float Akinator recomputes; it is not worth a divergence.
+    return (
+        a.question == b.question
+        and a.step == b.step
+        and a.win == b.win
+        and a.finished == b.finished
+        and a.name_proposition == b.name_proposition
+    )
+
+
+def _compact(state: GameState) -> GameState:
+    # The same few thousand questions and names recur across the whole trie.
+    return replace(
+        state,
+        question=sys.intern(state.question),
+        name_proposition=state.name_proposition and sys.intern(state.name_proposition),
+    )
+
+
+class _Node:
+    __slots__ = ("children", "key", "parent", "state")
+
+    def __init__(self, parent: _Node | None, key: str, state: GameState) -> None:
+        self.parent = parent
+        self.key = key
+        self.state = state
+        self.children: dict[str, _Node] | None = None
+
+
+class PathCache:
+    """Game states seen in live games, in a trie keyed by language and path.
+
+    Nodes are kept in least-recently-used order, and touching a node touches
+    its ancestors after it, so a parent is always newer than its children.
+    The front of the order is therefore always a leaf, and evicting down to
+    ``max_nodes`` never cuts a subtree loose.
+    """
+
+    def __init__(self, max_nodes: int) -> None:
+        self.max_nodes = max_nodes
+        self._roots: dict[str, _Node] = {}
+        self._lru: OrderedDict[_Node, None] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.games = 0
+        self.fast_forwards = 0
+        self.replayed = 0
+        self.divergences = 0
+        self.evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_nodes > 0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        # Every hit is an upstream call not made; replays are calls made late.
+        saved = self.hits - self.replayed
+        return {
+            "enabled": self.enabled,
+            "nodes": len(self._lru),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "games": self.games,
+            "fast_forwards": self.fast_forwards,
+            "divergences": self.divergences,
+            "evicted": self.evicted,
+            "upstream_calls_saved": saved,
+            "saved_per_game": saved / self.games if self.games else 0.0,
+        }
+
+    def _find(self, language: str, path: str) -> _Node | None:
+        node = self._roots.get(language)
+        for key in path:
+            if node is None or node.children is None:
+                return None
+            node = node.children.get(key)
+        return node
+
+    def _touch(self, node: _Node | None) -> None:
+        while node is not None:
+            self._lru.move_to_end(node)
+            node = node.parent
+
+    def _unlink(self, node: _Node) -> None:
+        if node.parent is None:
+            del self._roots[node.key]
+        else:
+            assert node.parent.children is not None
+            del node.parent.children[node.key]
+            if not node.parent.children:
+                node.parent.children = None
+
+    def _prune(self, node: _Node) -> None:
+        stack = list((node.children or {}).values())
+        node.children = None
+        while stack:
+            child = stack.pop()
+            stack.extend((child.children or {}).values())
+            del self._lru[child]
+            self.evicted += 1
+
+    def lookup(self, language: str, path: str) -> GameState | None:
+        """The recorded state at ``path``, counted as a hit or a miss."""
+        node = self._find(language, path)
+        if node is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(node)
+        return node.state
+
+    def record(self, language: str, path: str, state: GameState) -> None:
+        """Remember that a live game reached ``state`` by ``path``.
+
+        Dropped if the parent path is not in the trie. A state that disagrees
+        with the recorded one replaces it, and everything below it goes.
+        """
+        if not self.enabled:
+            return
+        parent = self._find(language, path[:-1]) if path else None
+        if path and parent is None:
+            return
+        if parent is None:
+            node = self._roots.get(language)
+        else:
+            node = (parent.children or {}).get(path[-1])
+        if node is None:
+            # A root is keyed by its language, every other node by its step.
+            node = _Node(parent, path[-1] if path else language, _compact(state))
+            if parent is None:
+                self._roots[language] = node
+            else:
+                if parent.children is None:
+                    parent.children = {}
+                parent.children[node.key] = node
+            self._lru[node] = None
+        elif not _same(node.state, state):
+            self.divergences += 1
+            self._prune(node)
+            node.state = _compact(state)
+        self._touch(node)
+        while len(self._lru) > self.max_nodes:
+            stale, _ = self._lru.popitem(last=False)
+            self._unlink(stale)
+            self.evicted += 1
+
+
+cache = PathCache(settings.path_cache_size)
+
+
+@dataclass(frozen=True, slots=True)
+class PathState:
+    """A game as CachedEngine stores it.
+
+    ``game`` is set while the game has only been served from the cache
+    (``upstream`` is None). ``path`` becomes None once the game does
+    something the cache can't key, such as going back past a rejected guess.
+    """
+
+    language: str
+    path: str | None
+    game: GameState | None = None
+    upstream: UpstreamState | None = None
+
+    @property
+    def virtual(self) -> bool:
+        return self.upstream is None
+
+    @property
+    def _current(self) -> GameState | UpstreamState:
+        current = self.upstream or self.game
+        assert current is not None
+        return current
+
+    @property
+    def step(self) -> int:
+        return self._current.step
+
+    @property
+    def win(self) -> bool:
+        return self._current.win
+
+    @property
+    def finished(self) -> bool:
+        return self._current.finished
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "language": self.language,
+            "path": self.path,
+            "game": asdict(self.game) if self.game else None,
+            "upstream": self.upstream.to_dict() if self.upstream else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> PathState:
+        game, upstream = data["game"], data["upstream"]
+        return cls(
+            language=data["language"],
+            path=data["path"],
+            game=GameState(**game) if game else None,
+            upstream=UpstreamState.from_dict(upstream) if upstream else None,
+        )
+
+
+class CachedEngine:
+    """AsyncAkinatorEngine that plays from the PathCache for as long as it can.
+
+    A new game starts from the cached first question without an upstream
+    call, and each step along a path some earlier game took is served from
+    the trie. The first step off the map starts an upstream game, replays the
+    path on it, then carries on as a plain upstream game that records every
+    state it reaches for later games.
+    """
+
+    state_type = PathState
+
+    def __init__(self, path_cache: PathCache | None = None) -> None:
+        self._cache = path_cache or cache
+        self._state: PathState | None = None
+        self._inner: AsyncAkinatorEngine | None = None
+
+    @classmethod
+    def restore(cls, state: PathState, path_cache: PathCache | None = None) -> Self:
+        engine = cls(path_cache)
+        engine._state = state
+        if state.upstream is not None:
+            engine._inner = AsyncAkinatorEngine.restore(state.upstream)
+        return engine
+
+    def dump(self) -> PathState:
+        state = self._state
+        if state is None:
+            raise RuntimeError("engine not started")
+        if self._inner is None:
+            return state
+        return PathState(state.language, state.path, upstream=self._inner.dump())
+
+    def snapshot(self) -> GameState:
+        if self._inner is not None:
+            return self._inner.snapshot()
+        state = self.dump()
+        assert state.game is not None
+        return state.game
+
+    async def _fast_forward(self) -> AsyncAkinatorEngine:
+        """Start an upstream game and replay this game's path on it."""
+        state = self.dump()
+        if state.path is None:
+            raise RuntimeError("a virtual game always has a path")
+        cache = self._cache
+        cache.fast_forwards += 1
+        inner = AsyncAkinatorEngine()
+        result = await inner.start_game(state.language)
+        cache.replayed += 1
+        cache.record(state.language, "", result)
+        for i, key in enumerate(state.path, 1):
+            if key == EXCLUDE:
+                result = await inner.exclude()
+            else:
+                result = await inner.answer(key)
+            cache.replayed += 1
+            cache.record(state.language, state.path[:i], result)
+        self._inner = inner
+        return inner
+
+    async def _step(
+        self,
+        path: str | None,
+        call: Callable[[AsyncAkinatorEngine], Awaitable[GameState]],
+    ) -> GameState:
+        state = self.dump()
+        inner = self._inner
+        if inner is None:
+            if state.finished:
+                raise InvalidAnswerError("The game is over")
+            cached = None if path is None else self._cache.lookup(state.language, path)
+            if cached is not None:
+                self._state = replace(state, path=path, game=cached)
+                return cached
+            inner = await self._fast_forward()
+        result = await call(inner)
+        if path is not None:
+            self._cache.record(state.language, path, result)
+        self._state = PathState(state.language, path)
+        return result
+
+    def _extend(self, key: str) -> str | None:
+        path = self.dump().path
+        return None if path is None else path + key
+
+    async def start_game(self, language: str = "en") -> GameState:
+        language = LANGUAGE_MAP.get(language.lower(), language.lower())
+        cached = self._cache.lookup(language, "")
+        if cached is not None:
+            self._state = PathState(language, "", game=cached)
+        else:
+            inner = AsyncAkinatorEngine()
+            cached = await inner.start_game(language)
+            self._cache.record(language, "", cached)
+            self._inner = inner
+            self._state = PathState(language, "")
+        self._cache.games += 1
+        return cached
+
+    async def answer(self, key: str) -> GameState:
+        key = _KEY_FOR_ANSWER.get(key.lower(), key.lower())
+        if key not in ANSWER_ALIASES:
+            raise InvalidAnswerError(
+                f"Invalid answer: {key}. Valid answers are: {', '.join(ANSWER_ALIASES)}"
+            )
+        return await self._step(self._extend(key), lambda inner: inner.answer(key))
+
+    async def back(self) -> GameState:
+        state = self.dump()
+        path = state.path
+        if state.virtual and path == "":
+            raise CantGoBackError("Can't go back any further")
+        # Only an answer can be undone by walking up the trie.
+        parent = path[:-1] if path and path[-1] in ANSWER_ALIASES else None
+        return await self._step(parent, lambda inner: inner.back())
+
+    async def choose(self) -> GameState:
+        return await self._step(self._extend(CHOOSE), lambda inner: inner.choose())
+
+    async def exclude(self) -> GameState:
+        return await self._step(self._extend(EXCLUDE), lambda inner: inner.exclude())
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from typing import Any
+
+import deadline
+import resilience
+import timing
+from engine import ANSWER_ALIASES, AsyncAkinatorEngine, GameBackend, GameState
+from exceptions import EngineError
+
+_Branch = tuple[Any, GameState]
+_KEY_FOR_ANSWER = {answer: key for key, answer in ANSWER_ALIASES.items()}
+
+
+def _consume(task: asyncio.Task) -> None:
+    # Unused branches may fail; that is not worth a "never retrieved" warning.
+    if not task.cancelled():
+        task.exception()
+
+
+class _Branches:
+    __slots__ = ("origin", "tasks")
+
+    def __init__(self, origin: Any, tasks: dict[str, asyncio.Task[_Branch]]) -> None:
+        self.origin = origin
+        self.tasks = tasks
+
+
+class Prefetcher:
+    """Answers the current question with every key before the player does.
+
+    When a question is served, one upstream ``answer`` per key in
+    ANSWER_ALIASES is fired from that same step. The branch matching the key
+    the player actually sends is committed, the rest are dropped. Speculation
+    is skipped rather than queued when it would exceed ``concurrency``
+    in-flight upstream calls.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        concurrency: int,
+        max_sessions: int,
+        backend: type[GameBackend] = AsyncAkinatorEngine,
+    ) -> None:
+        self.enabled = enabled
+        self._backend = backend
+        self._concurrency = concurrency
+        self._max_sessions = max_sessions
+        self._in_flight = 0
+        self._sessions: OrderedDict[str, _Branches] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+        self.skipped = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "wasted": self.wasted,
+            "skipped": self.skipped,
+            "in_flight": self._in_flight,
+        }
+
+    async def _speculate(self, origin: Any, key: str) -> _Branch:
+        timing.detach()
+        deadline.detach()
+        resilience.optional()
+        engine = self._backend.restore(origin)
+        state = await engine.answer(key)
+        return engine.dump(), state
+
+    def _landed(self, task: asyncio.Task) -> None:
+        self._in_flight -= 1
+
+    def schedule(self, session_id: str, origin: Any) -> None:
+        """Start speculating on every answer to the question in ``origin``."""
+        if not self.enabled:
+            return
+        self.discard(session_id)
+        if origin.win or origin.finished:
+            return
+        if self._in_flight + len(ANSWER_ALIASES) > self._concurrency:
+            self.skipped += 1
+            return
+        tasks = {}
+        for key in ANSWER_ALIASES:
+            # Counted from creation, so later calls in this tick see them; a
+            # done callback, unlike a finally, also runs if cancelled unstarted.
+            task = asyncio.create_task(self._speculate(origin, key))
+            self._in_flight += 1
+            task.add_done_callback(self._landed)
+            task.add_done_callback(_consume)
+            tasks[key] = task
+        self._sessions[session_id] = _Branches(origin, tasks)
+        while len(self._sessions) > self._max_sessions:
+            _, stale = self._sessions.popitem(last=False)
+            self._drop(stale.tasks.values())
+
+    def discard(self, session_id: str) -> None:
+        branches = self._sessions.pop(session_id, None)
+        if branches is not None:
+            self._drop(branches.tasks.values())
+
+    async def aclose(self) -> None:
+        while self._sessions:
+            _, branches = self._sessions.popitem()
+            self._drop(branches.tasks.values())
+            await asyncio.gather(*branches.tasks.values(), return_exceptions=True)
+
+    def _drop(self, tasks) -> None:
+        for task in tasks:
+            task.cancel()
+            self.wasted += 1
+
+    async def take(
+        self, session_id: str, engine: GameBackend, key: str
+    ) -> _Branch | None:
+        """Return the speculated result of answering ``key``, if there is one.
+
+        Only branches forked from the engine's current state count; when
+        there are others, or a branch failed, it is a miss. Either way the
+        caller should answer normally.
+        """
+        if not self.enabled:
+            return None
+        branches = self._sessions.pop(session_id, None)
+        if branches is None:
+            return None
+        if branches.origin != engine.dump():
+            self._drop(branches.tasks.values())
+            self.misses += 1
+            return None
+        task = branches.tasks.pop(_KEY_FOR_ANSWER.get(key, key), None)
+        self._drop(branches.tasks.values())
+        if task is None:
+            self.misses += 1
+            return None
+        try:
+            with timing.phase("wait"):
+                branch = await task
+        except EngineError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return branch
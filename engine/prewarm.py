@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from typing import Any
+
+from engine import AsyncAkinatorEngine, GameBackend, GameState
+from exceptions import EngineError
+
+logger = logging.getLogger(__name__)
+
+
+class WarmPool:
+    """Already-started games, per language code, ready to hand to ``POST /games``.
+
+    A background task keeps ``size`` games per language topped up and throws
+    away games older than ``max_age`` before Akinator expires them upstream.
+    """
+
+    def __init__(
+        self,
+        languages: list[str],
+        size: int,
+        max_age: float,
+        refill_interval: float,
+        backend: type[GameBackend] = AsyncAkinatorEngine,
+    ) -> None:
+        self._backend = backend
+        self._size = size
+        self._max_age = max_age
+        self._refill_interval = refill_interval
+        self._games: dict[str, deque[tuple[Any, GameState, float]]] = {
+            language: deque() for language in languages
+        }
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._size > 0 and bool(self._games)
+
+    def take(self, language: str) -> tuple[Any, GameState] | None:
+        games = self._games.get(language.lower())
+        if games is None:
+            self.misses += self.enabled
+            return None
+        now = time.monotonic()
+        while games:
+            upstream, state, created_at = games.popleft()
+            if now - created_at < self._max_age:
+                self.hits += 1
+                self._wakeup.set()
+                return upstream, state
+            self.discarded += 1
+        self.misses += 1
+        self._wakeup.set()
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "discarded": self.discarded,
+            "ready": {language: len(games) for language, games in self._games.items()},
+        }
+
+    def _discard_stale(self) -> None:
+        cutoff = time.monotonic() - self._max_age
+        for games in self._games.values():
+            while games and games[0][2] <= cutoff:
+                games.popleft()
+                self.discarded += 1
+
+    async def _warm_one(self, language: str) -> None:
+        engine = self._backend()
+        try:
+            state = await engine.start_game(language)
+        except EngineError:
+            logger.warning("Could not pre-warm a %s game", language, exc_info=True)
+            return
+        self._games[language].append((engine.dump(), state, time.monotonic()))
+
+    async def refill(self) -> None:
+        self._discard_stale()
+        await asyncio.gather(
+            *(
+                self._warm_one(language)
+                for language, games in self._games.items()
+                for _ in range(self._size - len(games))
+            )
+        )
+
+    async def _refill_forever(self) -> None:
+        while True:
+            self._wakeup.clear()
+            await self.refill()
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self._refill_interval)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._refill_forever())
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import Counter, Registry
+from settings import Settings
+
+
+class TokenBucket:
+    """``rate`` tokens a second, up to ``burst`` saved up."""
+
+    __slots__ = ("_at", "burst", "rate", "tokens")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._at = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._at) * self.rate)
+        self._at = now
+
+    def take(self, now: float) -> float:
+        """Take a token and return 0, or return the seconds until there is one."""
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def retry_after(seconds: float) -> str:
+    """A ``Retry-After`` value: whole seconds, rounded up, at least one."""
+    return str(max(1, math.ceil(seconds)))
+
+
+class ClientQuota:
+    """Token buckets per client, for the mutating game commands it sends.
+
+    A client is whoever sends the ``key_header`` value (an API key), or else
+    its address: the first entry of ``ip_header`` when the engine sits behind
+    a proxy that sets one, or the peer address. New games take from a bucket
+    of ``start_rate`` a second (bursts of ``start_burst``), every other command
+    from one of ``rate`` (``burst``); a rate of 0 leaves that kind unlimited.
+    Buckets of the ``capacity`` most recently seen clients are kept.
+    Turned-away commands are counted in ``rejections``, by kind.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        start_rate: float,
+        start_burst: int,
+        key_header: str,
+        ip_header: str,
+        capacity: int,
+        rejections: Counter,
+    ) -> None:
+        self._limits = {False: (rate, burst), True: (start_rate, start_burst)}
+        self._key_header = key_header.lower().encode()
+        self._ip_header = ip_header.lower().encode()
+        self._capacity = capacity
+        self._rejections = rejections
+        self._buckets: OrderedDict[tuple[str, bool], TokenBucket] = OrderedDict()
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return any(rate > 0 for rate, _ in self._limits.values())
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "clients": len(self._buckets),
+            "rejected": self.rejected,
+        }
+
+    def client(self, scope: Scope) -> str:
+        headers = dict(scope["headers"])
+        key = headers.get(self._key_header) if self._key_header else None
+        if key:
+            return "key:" + key.decode("latin-1")
+        forwarded = headers.get(self._ip_header) if self._ip_header else None
+        if forwarded:
+            return forwarded.split(b",", 1)[0].strip().decode("latin-1")
+        peer = scope.get("client")
+        return peer[0] if peer else ""
+
+    def take(self, client: str, start: bool) -> float:
+        """Charge ``client`` one command; 0, or seconds until it may send it."""
+        rate, burst = self._limits[start]
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        bucket = self._buckets.get((client, start))
+        if bucket is None:
+            bucket = self._buckets[client, start] = TokenBucket(rate, burst, now)
+            while len(self._buckets) > self._capacity:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end((client, start))
+        wait = bucket.take(now)
+        if wait:
+            self.rejected += 1
+            self._rejections.inc("start" if start else "command")
+        return wait
+
+
+def make_client_quota(settings: Settings, registry: Registry) -> ClientQuota:
+    """The client quota for the process clients connect to, counted in ``registry``."""
+    return ClientQuota(
+        rate=settings.client_rate,
+        burst=settings.client_burst,
+        start_rate=settings.client_start_rate,
+        start_burst=settings.client_start_burst,
+        key_header=settings.client_key_header,
+        ip_header=settings.client_ip_header,
+        capacity=settings.client_capacity,
+        rejections=registry.counter(
+            "akin_client_rejections_total",
+            "Game commands turned away by their client's rate limit",
+            ("kind",),
+        ),
+    )
+
+
+def _rejection(wait: float) -> dict:
+    return {
+        "error": "OverloadedError",
+        "message": f"Too many requests from this client; retry in {wait:.1f}s",
+    }
+
+
+class QuotaMiddleware:
+    """Applies a ClientQuota to ``POST /games...`` and game channel commands.
+
+    A request over its client's quota gets ``429 OverloadedError`` with a
+    ``Retry-After`` header. A channel command over quota is dropped and
+    answered with the same error, ``retry_after`` and the command's ``id``.
+    """
+
+    def __init__(self, app: ASGIApp, quota: ClientQuota) -> None:
+        self.app = app
+        self.quota = quota
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        quota = self.quota
+        if (
+            scope["type"] not in ("http", "websocket")
+            or not quota.enabled
+            or not scope["path"].startswith("/games")
+        ):
+            await self.app(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self.app(scope, self._channel(scope, receive, send), send)
+        elif scope["type"] == "http" and scope["method"] == "POST":
+            wait = quota.take(quota.client(scope), start=scope["path"] == "/games")
+            if wait:
+                await _reject(send, wait)
+                return
+            await self.app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    def _channel(self, scope: Scope, receive: Receive, send: Send) -> Receive:
+        quota = self.quota
+        client = quota.client(scope)
+
+        async def receive_within_quota() -> Message:
+            while True:
+                message = await receive()
+                if message["type"] != "websocket.receive" or not message.get("text"):
+                    return message
+                try:
+                    command = orjson.loads(message["text"])
+                except orjson.JSONDecodeError:
+                    return message
+                if not isinstance(command, dict) or command.get("op") == "ping":
+                    return message
+                wait = quota.take(client, start=command.get("op") == "start")
+                if not wait:
+                    return message
+                reply = {
+                    "status": 429,
+                    "error": _rejection(wait),
+                    "retry_after": int(retry_after(wait)),
+                }
+                if "id" in command:
+                    reply["id"] = command["id"]
+                await send(
+                    {"type": "websocket.send", "text": orjson.dumps(reply).decode()}
+                )
+
+        return receive_within_quota
+
+
+async def _reject(send: Send, wait: float) -> None:
+    body = orjson.dumps({"detail": _rejection(wait)})
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", retry_after(wait).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,550 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import defaultdict, deque
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from typing import TypeVar
+
+import deadline
+from exceptions import (
+    DeadlineExceededError,
+    EngineError,
+    NetworkError,
+    OverloadedError,
+    UpstreamUnavailableError,
+)
+from metrics import upstream_abandoned, upstream_quota_rejections, upstream_quota_wait
+from quota import TokenBucket
+from settings import settings
+from timing import phase
+
+T = TypeVar("T")
+
+# Every request for these carries the step it applies to, so re-sending one is
+# safe as long as the reply lands on the expected step. ``choose`` records a
+# win upstream and is never repeated.
+RETRY_SAFE = frozenset({"start", "answer", "back", "exclude"})
+
+_MIN_HEDGE_SAMPLES = 20
+
+# Whether upstream calls made by the current task are speculative, and may
+# be dropped first when the upstream is short of capacity.
+_optional: ContextVar[bool] = ContextVar("optional", default=False)
+
+
+def optional() -> None:
+    """Run upstream calls in this task as ``speculate``, the first to be shed."""
+    _optional.set(True)
+
+
+class CircuitBreaker:
+    """Stops calling the upstream after ``threshold`` consecutive failures.
+
+    While open, calls fail immediately. Every ``reset_timeout`` seconds one
+    probe is let through (half-open): success closes the breaker, failure
+    opens it again.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float) -> None:
+        self._threshold = threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half-open" if self._probing else "open"
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        now = time.monotonic()
+        # A probe that never reports back still only holds the breaker for
+        # another ``reset_timeout``.
+        if now - self._opened_at >= self._reset_timeout:
+            self._opened_at = now
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or (
+            self._opened_at is None and self._failures >= self._threshold
+        ):
+            self._opened_at = time.monotonic()
+            self._probing = False
+            self.trips += 1
+
+    def stats(self) -> dict:
+        return {"state": self.state, "trips": self.trips, "rejected": self.rejected}
+
+
+class AdaptiveLimiter:
+    """AIMD cap on in-flight upstream calls.
+
+    The limit grows by about one per limit's worth of fast successes and is
+    cut by ``backoff`` on a failure or a call slower than ``latency_target``.
+    New games may only use ``1 - start_reserve`` of it and speculative calls
+    ``1 - speculate_reserve``, so players already mid-game keep getting
+    through when the upstream is saturated, and speculation is shed first.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        latency_target: float,
+        start_reserve: float,
+        speculate_reserve: float = 0.5,
+        backoff: float = 0.9,
+    ) -> None:
+        self._limit = float(initial)
+        self._min = min_limit
+        self._max = max_limit
+        self._latency_target = latency_target
+        self._shares = {"start": 1 - start_reserve, "speculate": 1 - speculate_reserve}
+        self._backoff = backoff
+        self.in_flight = 0
+        self.rejected = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def try_acquire(self, op: str) -> bool:
+        cap = self._limit * self._shares.get(op, 1.0)
+        if self.in_flight >= max(1, int(cap)):
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float, ok: bool | None) -> None:
+        """Free a slot; ``ok`` is None for a call cut short by its caller."""
+        self.in_flight -= 1
+        if ok is None:
+            return
+        if ok and latency <= self._latency_target:
+            self._limit = min(self._max, self._limit + 1 / self._limit)
+        else:
+            self._limit = max(self._min, self._limit * self._backoff)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+
+class UpstreamQuota:
+    """Global budget of ``rate`` upstream calls a second, in bursts of ``burst``.
+
+    A call goes straight through while there are tokens and no one is
+    queued. Otherwise it queues under its priority, ``play`` for games in
+    progress and ``start`` for new ones, and queued calls are let through as
+    tokens come in, in proportion to the ``weights`` of the priorities
+    waiting. Players mid-game go first without new games starving. A call
+    that would queue longer than ``max_wait``, or past its request's
+    deadline, is turned away with OverloadedError; so is any optional call
+    that would queue at all. A rate of 0 disables the budget.
+    """
+
+    def __init__(
+        self, rate: float, burst: int, max_wait: float, weights: dict[str, int]
+    ) -> None:
+        self._bucket = (
+            TokenBucket(rate, max(1, burst), time.monotonic()) if rate > 0 else None
+        )
+        self._max_wait = max_wait
+        self._strides = {priority: 1 / weight for priority, weight in weights.items()}
+        # Stride scheduling: the priority with the lowest pass goes next, and
+        # each grant moves it on by its stride.
+        self._pass = dict.fromkeys(weights, 0.0)
+        self._last_pass = 0.0
+        self._queues: dict[str, deque[asyncio.Future[None]]] = {
+            priority: deque() for priority in weights
+        }
+        self._timer: asyncio.TimerHandle | None = None
+        self.waiting = 0
+        self.queued = 0
+        self.rejected = 0
+        self.skipped = 0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._bucket is not None,
+            "tokens": None if self._bucket is None else round(self._bucket.tokens, 2),
+            "waiting": {priority: len(q) for priority, q in self._queues.items()},
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "skipped": self.skipped,
+        }
+
+    async def acquire(self, priority: str, optional: bool = False) -> None:
+        """Wait for this call's turn, or raise OverloadedError."""
+        bucket = self._bucket
+        if bucket is None:
+            return
+        bucket.refill(time.monotonic())
+        if not self.waiting and bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return
+        wait = (self.waiting + 1 - bucket.tokens) / bucket.rate
+        left = deadline.remaining()
+        if optional or wait > self._max_wait or (left is not None and wait > left):
+            if optional:
+                self.skipped += 1
+                upstream_quota_rejections.inc("skipped")
+            else:
+                self.rejected += 1
+                upstream_quota_rejections.inc("rejected")
+            raise OverloadedError(
+                f"Over the upstream call budget; retry in {wait:.1f}s", wait
+            )
+        queue = self._queues[priority]
+        if not queue:
+            # A priority back from idle starts level with the others, not
+            # with credit saved up while it had nothing to send.
+            self._pass[priority] = max(self._pass[priority], self._last_pass)
+        turn = asyncio.get_running_loop().create_future()
+        queue.append(turn)
+        self.waiting += 1
+        self.queued += 1
+        self._schedule()
+        start = time.perf_counter()
+        try:
+            with phase("wait"):
+                await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled():
+                # Granted just as the call gave up: the token is unused.
+                self.refund()
+            raise
+        finally:
+            self.waiting -= 1
+            upstream_quota_wait.observe(time.perf_counter() - start, priority)
+
+    def refund(self) -> None:
+        """Give back the token of a call that was let through but never sent."""
+        bucket = self._bucket
+        if bucket is None:
+            return
+        bucket.tokens = min(bucket.burst, bucket.tokens + 1)
+        if any(self._queues.values()):
+            # A queued call can have it now rather than at the next grant.
+            if self._timer is not None:
+                self._timer.cancel()
+            self._grant()
+
+    def _schedule(self) -> None:
+        bucket = self._bucket
+        if self._timer is not None or bucket is None:
+            return
+        delay = max(0.0, (1 - bucket.tokens) / bucket.rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._grant)
+
+    def _grant(self) -> None:
+        self._timer = None
+        bucket = self._bucket
+        assert bucket is not None
+        bucket.refill(time.monotonic())
+        while bucket.tokens >= 1:
+            turn = self._next()
+            if turn is None:
+                return
+            bucket.tokens -= 1
+            turn.set_result(None)
+        if any(self._queues.values()):
+            self._schedule()
+
+    def _next(self) -> asyncio.Future[None] | None:
+        while True:
+            ready = [priority for priority, q in self._queues.items() if q]
+            if not ready:
+                return None
+            priority = min(ready, key=self._pass.__getitem__)
+            turn = self._queues[priority].popleft()
+            if turn.done():
+                # Its call gave up while queued.
+                continue
+            self._last_pass = self._pass[priority]
+            self._pass[priority] += self._strides[priority]
+            return turn
+
+
+class CallPolicy:
+    """How a single upstream operation is attempted.
+
+    Each attempt gets ``timeout`` seconds. Retry-safe operations are retried
+    up to ``retries`` times on transient errors, with full-jitter exponential
+    backoff. With ``hedge`` on, a second attempt races the first once it has
+    been running longer than the recent ``hedge_quantile`` latency for that
+    operation, and whichever succeeds first wins.
+
+    Calls are refused outright while ``breaker`` is open, and each attempt
+    needs a slot from ``limiter``; ``start`` only gets the non-reserved share.
+    Each attempt also spends a token of ``quota``, which hedges and calls
+    marked :func:`optional` only take if one is free. Those run as op
+    ``speculate``: the smallest share of the limiter, and never retried.
+
+    Within a request with a deadline, no attempt, retry or hedge is started
+    once it has passed, and each attempt's timeout is cut to the time left.
+    Running out of time is not the upstream's fault, so it counts against
+    neither the breaker nor the limiter.
+    """
+
+    def __init__(
+        self,
+        timeout: float,
+        retries: int,
+        backoff: float,
+        backoff_max: float,
+        hedge: bool,
+        hedge_quantile: float,
+        hedge_min_delay: float,
+        breaker: CircuitBreaker,
+        limiter: AdaptiveLimiter,
+        quota: UpstreamQuota | None = None,
+        window: int = 256,
+    ) -> None:
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._backoff_max = backoff_max
+        self._hedge = hedge
+        self._hedge_quantile = hedge_quantile
+        self._hedge_min_delay = hedge_min_delay
+        self.breaker = breaker
+        self.limiter = limiter
+        self.quota = quota or UpstreamQuota(0, 0, 0, {})
+        self._latencies: defaultdict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_skips = 0
+        self.deadline_cuts = 0
+
+    def stats(self) -> dict:
+        return {
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "deadline_skips": self.deadline_skips,
+            "deadline_cuts": self.deadline_cuts,
+            "hedge_delay": {op: self._hedge_delay(op) for op in self._latencies},
+            "breaker": self.breaker.stats(),
+            "limiter": self.limiter.stats(),
+            "quota": self.quota.stats(),
+        }
+
+    def _hedge_delay(self, op: str) -> float | None:
+        samples = self._latencies[op]
+        if len(samples) < _MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        quantile = ordered[int(self._hedge_quantile * (len(ordered) - 1))]
+        return max(self._hedge_min_delay, quantile)
+
+    def _sleep_for(self, retry: int) -> float:
+        return random.uniform(0, min(self._backoff_max, self._backoff * 2**retry))
+
+    def _budget(self, op: str, wait: float = 0.0) -> float | None:
+        """Timeout for an attempt at ``op`` starting ``wait`` seconds from now.
+
+        None if the request's deadline will have passed by then.
+        """
+        left = deadline.remaining()
+        if left is None:
+            return self._timeout
+        if left <= wait:
+            self.deadline_skips += 1
+            upstream_abandoned.inc(op, "skipped")
+            return None
+        return min(self._timeout, left - wait)
+
+    def _expired(self, op: str) -> DeadlineExceededError:
+        return DeadlineExceededError(f"Deadline passed before upstream {op} finished")
+
+    async def run(
+        self,
+        op: str,
+        attempt: Callable[[], Awaitable[T]],
+        *,
+        transient: type[EngineError] = NetworkError,
+        validate: Callable[[T], None] | None = None,
+    ) -> T:
+        """Run ``attempt`` under the policy and return the first good result.
+
+        ``attempt`` must start from scratch every call. Only ``transient``
+        errors are retried. ``validate`` runs on results of retries and hedges
+        (where the upstream may already have seen the request) and any error
+        it raises ends the call without further attempts.
+        """
+        if _optional.get():
+            op = "speculate"
+        if self._budget(op) is None:
+            raise self._expired(op)
+        if not self.breaker.allow():
+            raise UpstreamUnavailableError(
+                "Akinator is failing; not calling it for a while"
+            )
+        safe = op in RETRY_SAFE
+        tries = 1 + (self._retries if safe else 0)
+        for n in range(tries):
+            if n:
+                sleep = self._sleep_for(n - 1)
+                if self._budget(op, sleep) is None:
+                    raise self._expired(op)
+                self.retries += 1
+                with phase("wait"):
+                    await asyncio.sleep(sleep)
+            try:
+                result, hedged = await self._attempt(op, attempt, transient, safe)
+            except transient:
+                self.breaker.record_failure()
+                if n == tries - 1:
+                    raise
+                continue
+            self.breaker.record_success()
+            if validate is not None and (n or hedged):
+                validate(result)
+            return result
+        raise AssertionError("unreachable")
+
+    async def _timed(
+        self,
+        op: str,
+        attempt: Callable[[], Awaitable[T]],
+        transient: type[EngineError],
+        hedge: bool = False,
+    ) -> T:
+        if self._budget(op) is None:
+            raise self._expired(op)
+        await self.quota.acquire(
+            "start" if op == "start" else "play", hedge or op == "speculate"
+        )
+        timeout = self._budget(op)
+        if timeout is None:
+            self.quota.refund()
+            raise self._expired(op)
+        if not self.limiter.try_acquire(op):
+            self.quota.refund()
+            raise OverloadedError("Too many upstream calls in flight; try again")
+        start = time.perf_counter()
+        ok: bool | None = True
+        try:
+            result = await asyncio.wait_for(attempt(), timeout)
+        except TimeoutError as e:
+            if timeout < self._timeout:
+                ok = None
+                self.deadline_cuts += 1
+                upstream_abandoned.inc(op, "cut")
+                raise self._expired(op) from e
+            ok = False
+            self.timeouts += 1
+            raise transient(f"Upstream {op} timed out after {self._timeout:g}s") from e
+        except asyncio.CancelledError:
+            ok = None
+            raise
+        except transient:
+            ok = False
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            self.limiter.release(latency, ok)
+        self._latencies[op].append(latency)
+        return result
+
+    async def _attempt(
+        self,
+        op: str,
+        attempt: Callable[[], Awaitable[T]],
+        transient: type[EngineError],
+        safe: bool,
+    ) -> tuple[T, bool]:
+        delay = self._hedge_delay(op) if self._hedge and safe else None
+        if delay is None:
+            return await self._timed(op, attempt, transient), False
+        primary = asyncio.ensure_future(self._timed(op, attempt, transient))
+        tasks = [primary]
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            left = deadline.remaining()
+            if not done and (left is None or left > 0):
+                self.hedges += 1
+                hedge = asyncio.ensure_future(
+                    self._timed(op, attempt, transient, hedge=True)
+                )
+                tasks.append(hedge)
+                pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        hedged = task is not primary
+                        self.hedge_wins += hedged
+                        return task.result(), hedged
+            # A hedge refused for want of capacity says nothing about the
+            # upstream, so report the primary's failure ahead of the hedge's.
+            errors = [t.exception() for t in tasks if not t.cancelled()]
+            raise next(e for e in errors if e is not None)
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+policy = CallPolicy(
+    timeout=settings.upstream_timeout,
+    retries=settings.upstream_retries,
+    backoff=settings.upstream_backoff,
+    backoff_max=settings.upstream_backoff_max,
+    hedge=settings.upstream_hedge,
+    hedge_quantile=settings.upstream_hedge_quantile,
+    hedge_min_delay=settings.upstream_hedge_min_delay,
+    breaker=CircuitBreaker(
+        threshold=settings.breaker_threshold,
+        reset_timeout=settings.breaker_reset_timeout,
+    ),
+    limiter=AdaptiveLimiter(
+        initial=settings.limit_initial,
+        min_limit=settings.limit_min,
+        max_limit=settings.limit_max,
+        latency_target=settings.limit_latency_target,
+        start_reserve=settings.limit_start_reserve,
+        speculate_reserve=settings.limit_speculate_reserve,
+    ),
+    # Shards share one egress, so each gets its share of the budget.
+    quota=UpstreamQuota(
+        rate=settings.upstream_rate / max(1, settings.shards),
+        burst=settings.upstream_burst // max(1, settings.shards),
+        max_wait=settings.upstream_max_wait,
+        weights={
+            "play": settings.upstream_play_weight,
+            "start": settings.upstream_start_weight,
+        },
+    ),
+)
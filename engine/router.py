@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import uuid
+import zlib
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+import orjson
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from websockets.asyncio.client import ClientConnection, unix_connect
+from websockets.exceptions import ConnectionClosed, WebSocketException
+
+from deadline import DeadlineMiddleware
+from metrics import Registry
+from quota import QuotaMiddleware, make_client_quota
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Hop-by-hop headers, and ones httpx or uvicorn set again themselves.
+_SKIP_HEADERS = frozenset(
+    {
+        "connection",
+        "content-length",
+        "host",
+        "keep-alive",
+        "transfer-encoding",
+        "upgrade",
+    }
+)
+
+
+def new_session_id() -> str:
+    """A session ID that names the shard which minted it, if this is one."""
+    if settings.shard < 0:
+        return str(uuid.uuid4())
+    return f"{settings.shard}.{uuid.uuid4()}"
+
+
+def shard_of(session_id: str, count: int) -> int | None:
+    """The shard that owns ``session_id``, or None if no shard could."""
+    prefix, dot, _ = session_id.partition(".")
+    if not dot or not prefix.isdigit() or int(prefix) >= count:
+        return None
+    return int(prefix)
+
+
+def merge_metrics(texts: dict[int, str]) -> str:
+    """One Prometheus exposition from each shard's, with a ``shard`` label.
+
+    Samples are regrouped under their family's HELP and TYPE lines, which the
+    format requires to appear once, ahead of all of that family's samples.
+    """
+    headers: dict[str, list[str]] = {}
+    samples: dict[str, list[str]] = {}
+    for shard, text in texts.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                family = line.split(" ", 3)[2]
+                seen = headers.setdefault(family, [])
+                if line not in seen:
+                    seen.append(line)
+                samples.setdefault(family, [])
+            elif line and family is not None:
+                series, value = line.rsplit(" ", 1)
+                label = f'shard="{shard}"'
+                if series.endswith("}"):
+                    series = f"{series[:-1]},{label}}}"
+                else:
+                    series = f"{series}{{{label}}}"
+                samples[family].append(f"{series} {value}")
+    lines = []
+    for family, header in headers.items():
+        lines.extend(header)
+        lines.extend(samples[family])
+    return "\n".join(lines) + "\n"
+
+
+class ShardSupervisor:
+    """Runs one engine worker process per shard, each on its own Unix socket.
+
+    A worker that exits is started again empty, so a crash loses only the
+    games on its own shard. Requests for that shard fail until it is back.
+    """
+
+    def __init__(self, count: int, socket_dir: str = "") -> None:
+        self.count = count
+        self._socket_dir = socket_dir
+        self._dir = Path()
+        self.sockets: list[Path] = []
+        self._procs: list[subprocess.Popen | None] = [None] * count
+        self._clients: list[httpx.AsyncClient] = []
+        self._next = itertools.cycle(range(count))
+        self._watcher: asyncio.Task | None = None
+        self.restarts = 0
+
+    def _spawn(self, shard: int) -> None:
+        self.sockets[shard].unlink(missing_ok=True)
+        self._procs[shard] = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "server:app",
+                "--uds",
+                str(self.sockets[shard]),
+                "--no-access-log",
+            ],
+            cwd=Path(__file__).parent,
+            env={**os.environ, "AKIN_SHARD": str(shard)},
+        )
+
+    def up(self, shard: int) -> bool:
+        proc = self._procs[shard]
+        return proc is not None and proc.poll() is None and self.sockets[shard].exists()
+
+    def client(self, shard: int) -> httpx.AsyncClient:
+        return self._clients[shard]
+
+    def pick(self, key: str | None = None) -> list[int]:
+        """Live shards in round-robin order, the next one for a new game first.
+
+        With a ``key``, the order starts at the shard it hashes to instead, so
+        retries of one request all reach the same shard while it is up.
+        """
+        if key is None:
+            start = next(self._next)
+        else:
+            start = zlib.crc32(key.encode()) % self.count
+        order = [(start + i) % self.count for i in range(self.count)]
+        return [shard for shard in order if self.up(shard)]
+
+    async def start(self, ready_timeout: float = 30.0) -> None:
+        self._dir = Path(self._socket_dir or tempfile.mkdtemp(prefix="akin-shards-"))
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self.sockets = [self._dir / f"shard-{i}.sock" for i in range(self.count)]
+        self._clients = [
+            httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=str(path)),
+                base_url="http://shard",
+                timeout=httpx.Timeout(None, connect=1.0),
+            )
+            for path in self.sockets
+        ]
+        for shard in range(self.count):
+            self._spawn(shard)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + ready_timeout
+        while not all(self.up(shard) for shard in range(self.count)):
+            if loop.time() > deadline:
+                raise RuntimeError("Shards did not come up in time")
+            await asyncio.sleep(0.05)
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            for shard, proc in enumerate(self._procs):
+                if proc is not None and proc.poll() is not None:
+                    logger.warning(
+                        "Shard %d exited with %s; restarting", shard, proc.returncode
+                    )
+                    self.restarts += 1
+                    shard_restarts.inc()
+                    self._spawn(shard)
+
+    async def aclose(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._watcher
+        for proc in self._procs:
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+        for proc in self._procs:
+            if proc is not None:
+                try:
+                    await asyncio.to_thread(proc.wait, 10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        for client in self._clients:
+            await client.aclose()
+        if not self._socket_dir:
+            shutil.rmtree(self._dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {
+            "shards": self.count,
+            "up": sum(self.up(shard) for shard in range(self.count)),
+            "restarts": self.restarts,
+        }
+
+
+_registry = Registry()
+shard_restarts = _registry.counter(
+    "akin_shard_restarts_total", "Shard worker processes restarted after exiting"
+)
+
+supervisor = ShardSupervisor(settings.shards, settings.shard_socket_dir)
+_quota = make_client_quota(settings, _registry)
+_registry.gauge(
+    "akin_shards_up",
+    "Shard worker processes accepting requests",
+    lambda: supervisor.stats()["up"],
+)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await supervisor.start()
+    try:
+        yield
+    finally:
+        await supervisor.aclose()
+
+
+# The shards serve the docs and schema; the router only forwards to them.
+app = FastAPI(lifespan=lifespan, openapi_url=None, docs_url=None, redoc_url=None)
+# Cancelling a forwarded request drops its connection to the shard, which then
+# cancels the request there too.
+app.add_middleware(DeadlineMiddleware, default=settings.request_timeout)
+# Client quotas are kept here, where all of a client's games meet; a shard
+# only sees the games it owns.
+app.add_middleware(QuotaMiddleware, quota=_quota)
+
+
+def _error(status: int, error: str, message: str) -> JSONResponse:
+    return JSONResponse(
+        {"detail": {"error": error, "message": message}}, status_code=status
+    )
+
+
+def _unavailable(shard: int) -> JSONResponse:
+    return _error(503, "ShardUnavailable", f"Shard {shard} is restarting")
+
+
+async def _forward(shard: int, request: Request) -> Response:
+    headers = [
+        (name, value)
+        for name, value in request.headers.items()
+        if name not in _SKIP_HEADERS
+    ]
+    resp = await supervisor.client(shard).request(
+        request.method,
+        request.url.path,
+        params=request.url.query,
+        headers=headers,
+        content=await request.body(),
+    )
+    return Response(
+        resp.content,
+        status_code=resp.status_code,
+        headers={
+            name: value
+            for name, value in resp.headers.items()
+            if name not in _SKIP_HEADERS
+        },
+    )
+
+
+async def _gather(path: str) -> dict[int, httpx.Response]:
+    live = [shard for shard in range(supervisor.count) if supervisor.up(shard)]
+    results = await asyncio.gather(
+        *(supervisor.client(shard).get(path) for shard in live),
+        return_exceptions=True,
+    )
+    return {
+        shard: resp
+        for shard, resp in zip(live, results)
+        if isinstance(resp, httpx.Response) and resp.is_success
+    }
+
+
+@app.get("/stats", include_in_schema=False)
+async def stats() -> dict:
+    shards = await _gather("/stats")
+    return {
+        "router": {**supervisor.stats(), "clients": _quota.stats()},
+        "shards": {shard: resp.json() for shard, resp in shards.items()},
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    shards = await _gather("/metrics")
+    text = merge_metrics({shard: resp.text for shard, resp in shards.items()})
+    return PlainTextResponse(
+        text + _registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.websocket("/games/ws")
+async def game_channel(websocket: WebSocket, session_id: str | None = None) -> None:
+    """Relay a game channel to the shard that owns, or will own, its game."""
+    if session_id is None:
+        candidates = supervisor.pick()
+    else:
+        shard = shard_of(session_id, supervisor.count)
+        candidates = [] if shard is None else [shard]
+    upstream: ClientConnection | None = None
+    for shard in candidates:
+        query = f"?{websocket.url.query}" if websocket.url.query else ""
+        try:
+            upstream = await unix_connect(
+                str(supervisor.sockets[shard]), f"ws://shard/games/ws{query}"
+            )
+            break
+        except (OSError, WebSocketException):
+            continue
+    await websocket.accept()
+    if upstream is None:
+        if session_id is not None and not candidates:
+            status, error = 404, "SessionNotFound"
+            message = f"Session {session_id!r} not found"
+        else:
+            status, error, message = 503, "ShardUnavailable", "No shard is available"
+        await websocket.send_text(
+            orjson.dumps(
+                {"status": status, "error": {"error": error, "message": message}}
+            ).decode()
+        )
+        await websocket.close(code=1008 if status == 404 else 1013, reason=error)
+        return
+
+    async def to_shard() -> None:
+        while True:
+            await upstream.send(await websocket.receive_text())
+
+    async def to_client() -> None:
+        async for message in upstream:
+            await websocket.send_text(str(message))
+
+    tasks = [asyncio.create_task(to_shard()), asyncio.create_task(to_client())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        await upstream.close()
+    if any(isinstance(r, WebSocketDisconnect) for r in results):
+        return
+    # The shard closed the channel (idle, unknown session, or crashed).
+    with contextlib.suppress(RuntimeError, ConnectionClosed):
+        await websocket.close(
+            code=upstream.close_code or 1011, reason=upstream.close_reason or ""
+        )
+
+
+_METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+
+
+@app.api_route("/{path:path}", methods=_METHODS, include_in_schema=False)
+async def forward(path: str, request: Request) -> Response:
+    """Send a request to the shard named in its session ID, or any for new games."""
+    parts = path.split("/")
+    if parts[0] == "games" and len(parts) > 1:
+        shard = shard_of(parts[1], supervisor.count)
+        if shard is None:
+            return _error(404, "SessionNotFound", f"Session {parts[1]!r} not found")
+        if not supervisor.up(shard):
+            return _unavailable(shard)
+        try:
+            return await _forward(shard, request)
+        except httpx.TransportError:
+            return _unavailable(shard)
+    # A new game, or the docs: any live shard will do, though retries of one
+    # keyed request need the shard holding its Idempotency-Key. Nothing has
+    # reached a shard that refused the connection, so it is safe to try the
+    # next one.
+    for shard in supervisor.pick(request.headers.get("idempotency-key")):
+        try:
+            return await _forward(shard, request)
+        except httpx.ConnectError:
+            continue
+        except httpx.TransportError:
+            return _unavailable(shard)
+    return _error(503, "ShardUnavailable", "No shard is available")
+
+
+def run() -> None:
+    uvicorn.run(app, host=settings.host, port=settings.port)
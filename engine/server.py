@@ -1,44 +1,210 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-import uuid
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Any
 
+import orjson
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import (
+    HTMLResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    Response,
+)
 from pydantic import BaseModel, Field
 from scalar_fastapi import get_scalar_api_reference
 
-from engine import AkinatorEngine, GameState
+import timing
+from deadline import DeadlineMiddleware
+from engine import LANGUAGE_MAP, AsyncAkinatorEngine, GameBackend, GameState
 from exceptions import (
     CantGoBackError,
+    DeadlineExceededError,
     EngineError,
     InvalidAnswerError,
     InvalidLanguageError,
     NetworkError,
+    OverloadedError,
     SessionTimeoutError,
     StartupError,
+    UpstreamUnavailableError,
 )
+from idempotency import IdempotencyCache, IdempotencyMiddleware
+from journal import make_journal
+from lanes import SessionLanes
+from metrics import engine_errors, game_steps, registry
+from pathcache import CachedEngine, PathState
+from pathcache import cache as path_cache
+from prefetch import Prefetcher
+from prewarm import WarmPool
+from quota import QuotaMiddleware, make_client_quota, retry_after
+from resilience import policy
+from router import new_session_id
+from settings import settings
+from store import TieredSessionStore, make_session_store
+from timing import ServerTimingMiddleware, phase
+from transport import pool
 
 logger = logging.getLogger(__name__)
 
+
+_idempotency = IdempotencyCache(
+    settings.idempotency_cache_size, settings.idempotency_ttl
+)
+# Behind the router, clients are held to their quotas there.
+_clients = make_client_quota(settings, registry) if settings.shard < 0 else None
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    pool.start_reaper()
+    _sessions.start_sweeper()
+    if _journal is not None:
+        _journal.start()
+    _warm_pool.start()
+    try:
+        yield
+    finally:
+        await _prefetcher.aclose()
+        await _warm_pool.aclose()
+        if _journal is not None:
+            await _journal.aclose()
+        await _sessions.aclose()
+        await pool.aclose()
+
+
 app = FastAPI(
     title="Akin Engine",
     description="HTTP game server wrapping the Akinator API. Clients start a session, then drive it by posting answers.",
+    lifespan=lifespan,
 )
+# Inside the timing middleware, so replayed and expired responses get their
+# own timings.
+app.add_middleware(IdempotencyMiddleware, cache=_idempotency)
+app.add_middleware(DeadlineMiddleware, default=settings.request_timeout)
+if _clients is not None:
+    app.add_middleware(QuotaMiddleware, quota=_clients)
+if settings.server_timing:
+    app.add_middleware(ServerTimingMiddleware)
 
 
 @app.get("/", include_in_schema=False)
-def root() -> RedirectResponse:
+async def root() -> RedirectResponse:
     return RedirectResponse(url="/scalar")
 
 
 @app.get("/scalar", include_in_schema=False)
-def scalar_ui() -> HTMLResponse:
+async def scalar_ui() -> HTMLResponse:
     return get_scalar_api_reference(openapi_url=app.openapi_url, title=app.title)
 
 
-_sessions: dict[str, AkinatorEngine] = {}
+@app.get("/stats", include_in_schema=False)
+async def stats() -> dict:
+    return {
+        "warm_pool": _warm_pool.stats(),
+        "prefetch": _prefetcher.stats(),
+        "upstream": policy.stats(),
+        "path_cache": path_cache.stats(),
+        "journal": {"enabled": False} if _journal is None else _journal.stats(),
+        "idempotency": _idempotency.stats(),
+        "session_queues": _lanes.stats(),
+        "clients": {"enabled": False} if _clients is None else _clients.stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def _make_backend() -> type[GameBackend]:
+    if settings.backend == "akinator":
+        return CachedEngine if path_cache.enabled else AsyncAkinatorEngine
+    if settings.backend == "local":
+        try:
+            from local import LocalEngine, default_matrix
+        except ModuleNotFoundError as e:
+            raise SystemExit(
+                "AKIN_BACKEND=local needs numpy (uv sync --extra local)"
+            ) from e
+        default_matrix()  # fail at startup, not on the first game
+        return LocalEngine
+    raise ValueError(f"Unknown backend {settings.backend!r}")
+
+
+_backend = _make_backend()
+# Pre-warming and speculation only pay off when every step is a network call.
+_remote = settings.backend == "akinator"
+
+# Only serializable game state is stored; engines are rehydrated per
+# request, so any worker sharing the store can serve any session.
+_sessions = make_session_store(settings, _backend.state_type)
+_journal = make_journal(settings, _backend.state_type)
+
+_warm_pool = WarmPool(
+    languages=[
+        code
+        for code in map(str.strip, settings.prewarm_languages.split(","))
+        if code in LANGUAGE_MAP and _remote
+    ],
+    size=settings.prewarm_size,
+    max_age=settings.prewarm_max_age,
+    refill_interval=settings.prewarm_refill_interval,
+    backend=_backend,
+)
+
+_prefetcher = Prefetcher(
+    enabled=settings.prefetch_enabled and _remote,
+    concurrency=settings.prefetch_concurrency,
+    max_sessions=settings.prefetch_max_sessions,
+    backend=_backend,
+)
+
+_channels: set[WebSocket] = set()
+# Commands on one game run in arrival order; see SessionLanes.
+_lanes = SessionLanes(settings.session_queue_depth)
+
+registry.gauge("akin_sessions", "Live game sessions", lambda: len(_sessions))
+registry.gauge(
+    "akin_ws_channels", "Open WebSocket game channels", lambda: len(_channels)
+)
+registry.gauge(
+    "akin_session_queue_waiting",
+    "Commands waiting for an earlier one on the same game",
+    lambda: _lanes.waiting,
+)
+if isinstance(_sessions, TieredSessionStore):
+    registry.gauge(
+        "akin_sessions_hibernated",
+        "Sessions hibernated out of memory",
+        lambda: _sessions.hibernated,
+    )
+registry.gauge(
+    "akin_upstream_in_flight",
+    "Upstream calls in flight",
+    lambda: policy.limiter.in_flight,
+)
+registry.gauge(
+    "akin_upstream_limit",
+    "Current adaptive cap on in-flight upstream calls",
+    lambda: policy.limiter.limit,
+)
+registry.gauge(
+    "akin_upstream_pool_in_use",
+    "Pooled upstream connections in use",
+    lambda: pool.in_flight,
+)
+registry.gauge(
+    "akin_upstream_pool_size", "Pooled upstream connections", lambda: pool.size
+)
 
 
 # --------------------------------------------------------------------------- #
@@ -57,18 +223,6 @@ class GameStateOut(BaseModel):
         description="Short description of the guess"
     )
 
-    @classmethod
-    def from_state(cls, state: GameState) -> "GameStateOut":
-        return cls(
-            question=state.question,
-            step=state.step,
-            progression=state.progression,
-            win=state.win,
-            finished=state.finished,
-            name_proposition=state.name_proposition,
-            description_proposition=state.description_proposition,
-        )
-
 
 class StartGameRequest(BaseModel):
     language: str = Field(
@@ -83,6 +237,13 @@ class AnswerRequest(BaseModel):
     )
 
 
+class AnswersRequest(BaseModel):
+    keys: list[str] = Field(
+        min_length=1,
+        description="Answer keys to apply in order (same keys as `/answer`)",
+    )
+
+
 class StartGameResponse(BaseModel):
     session_id: str = Field(
         description="Unique session ID - pass this in all later requests"
@@ -94,6 +255,12 @@ class StateResponse(BaseModel):
     state: GameStateOut
 
 
+class StatesResponse(BaseModel):
+    states: list[GameStateOut] = Field(
+        description="State after each applied answer, in order"
+    )
+
+
 class ErrorDetail(BaseModel):
     error: str = Field(description="Error type name")
     message: str = Field(description="Human-readable error message")
@@ -103,6 +270,21 @@ class ErrorResponse(BaseModel):
     detail: ErrorDetail
 
 
+class GameJSONResponse(Response):
+    """Game route responses, encoded straight from GameState dataclasses.
+
+    Routes still declare their pydantic ``response_model`` so the OpenAPI
+    schema is unchanged, but a returned Response skips FastAPI's validation
+    and re-serialization. GameState has the same fields as GameStateOut.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with phase("serialize"):
+            return orjson.dumps(content)
+
+
 # --------------------------------------------------------------------------- #
 # Error mapping                                                               #
 # --------------------------------------------------------------------------- #
@@ -114,15 +296,23 @@ _EXC_TO_STATUS: dict[type[EngineError], int] = {
     CantGoBackError: 409,
     SessionTimeoutError: 408,
     NetworkError: 502,
+    UpstreamUnavailableError: 503,
+    OverloadedError: 429,
+    DeadlineExceededError: 504,
 }
 
 
 def _engine_exc_to_http(exc: EngineError) -> HTTPException:
     status = _EXC_TO_STATUS.get(type(exc), 500)
+    engine_errors.inc(type(exc).__name__)
     logger.exception("Engine error (%s)", type(exc).__name__)
+    headers = None
+    if isinstance(exc, OverloadedError):
+        headers = {"Retry-After": retry_after(exc.retry_after)}
     return HTTPException(
         status_code=status,
         detail={"error": type(exc).__name__, "message": str(exc)},
+        headers=headers,
     )
 
 
@@ -131,9 +321,17 @@ def _engine_exc_to_http(exc: EngineError) -> HTTPException:
 # --------------------------------------------------------------------------- #
 
 
-def _get_session(session_id: str) -> AkinatorEngine:
-    engine = _sessions.get(session_id)
-    if engine is None:
+async def _get_session(session_id: str) -> GameBackend:
+    try:
+        state = await _sessions.get(session_id)
+    except SessionTimeoutError as e:
+        raise _engine_exc_to_http(e) from e
+    if state is None and _journal is not None:
+        # A game from before a restart, resumed from its last recorded state.
+        state = _journal.reattach(session_id)
+        if state is not None:
+            await _sessions.add(session_id, state)
+    if state is None:
         raise HTTPException(
             status_code=404,
             detail={
@@ -141,9 +339,125 @@ def _get_session(session_id: str) -> AkinatorEngine:
                 "message": f"Session {session_id!r} not found",
             },
         )
+    return _backend.restore(state)
+
+
+async def _save_session(
+    session_id: str,
+    state: Any,
+    op: str,
+    key: str | None = None,
+    *,
+    speculate: bool = True,
+) -> None:
+    if state.finished:
+        game_steps.observe(state.step, "win" if state.win else "gave_up")
+    await _sessions.add(session_id, state)
+    if _journal is not None:
+        _journal.record(session_id, op, key, state)
+    # A game still served from the path cache has no upstream to speculate on.
+    if speculate and not (isinstance(state, PathState) and state.virtual):
+        _prefetcher.schedule(session_id, state)
+
+
+async def _apply_answer(
+    session_id: str, engine: GameBackend, key: str, *, speculate: bool = True
+) -> tuple[GameBackend, GameState]:
+    branch = await _prefetcher.take(session_id, engine, key)
+    if branch is not None:
+        upstream, state = branch
+        engine = _backend.restore(upstream)
+    else:
+        state = await engine.answer(key)
+        upstream = engine.dump()
+    await _save_session(session_id, upstream, "answer", key, speculate=speculate)
+    return engine, state
+
+
+async def _replay(session_id: str, cause: SessionTimeoutError) -> GameBackend:
+    """Replay a game resumed from the journal whose upstream session is gone.
+
+    Re-raises ``cause`` for any other game.
+    """
+    engine = _backend()
+    if _journal is None or not await _journal.replay(session_id, engine):
+        raise cause
+    await _sessions.add(session_id, engine.dump())
     return engine
 
 
+async def _start_game(language: str) -> tuple[str, GameState]:
+    session_id = new_session_id()
+    warm = _warm_pool.take(language)
+    if warm is not None:
+        upstream, state = warm
+        await _save_session(session_id, upstream, "start", language)
+        return session_id, state
+    engine = _backend()
+    try:
+        state = await engine.start_game(language)
+    except EngineError as e:
+        raise _engine_exc_to_http(e) from e
+    await _save_session(session_id, engine.dump(), "start", language)
+    return session_id, state
+
+
+async def _answer_keys(session_id: str, keys: list[str]) -> list[GameState]:
+    """Apply ``keys`` in order, stopping early on a guess or the end of the game.
+
+    A key that fails leaves the ones before it applied; the error's detail
+    then carries their ``states``, so the client knows where the game is.
+    """
+    try:
+        async with _lanes.turn(session_id):
+            engine = await _get_session(session_id)
+            states = []
+            last = len(keys) - 1
+            for i, key in enumerate(keys):
+                speculate = i == last
+                try:
+                    try:
+                        engine, state = await _apply_answer(
+                            session_id, engine, key, speculate=speculate
+                        )
+                    except SessionTimeoutError as e:
+                        engine = await _replay(session_id, e)
+                        engine, state = await _apply_answer(
+                            session_id, engine, key, speculate=speculate
+                        )
+                except EngineError as e:
+                    error = _engine_exc_to_http(e)
+                    if states:
+                        error.detail["states"] = [asdict(s) for s in states]
+                    raise error from e
+                states.append(state)
+                if state.win or state.finished:
+                    break
+            return states
+    except OverloadedError as e:
+        # Turned away by a full command queue, before touching the game.
+        raise _engine_exc_to_http(e) from e
+
+
+async def _play(session_id: str, op: str) -> GameState:
+    """Run ``back``, ``choose`` or ``exclude`` on a stored game."""
+    try:
+        async with _lanes.turn(session_id):
+            engine = await _get_session(session_id)
+            try:
+                try:
+                    state = await getattr(engine, op)()
+                except SessionTimeoutError as e:
+                    engine = await _replay(session_id, e)
+                    state = await getattr(engine, op)()
+            except EngineError as e:
+                raise _engine_exc_to_http(e) from e
+            await _save_session(session_id, engine.dump(), op)
+            return state
+    except OverloadedError as e:
+        raise _engine_exc_to_http(e) from e
+
+
 # --------------------------------------------------------------------------- #
 # Reusable response docs                                                      #
 # --------------------------------------------------------------------------- #
@@ -154,9 +468,15 @@ def _err(description: str) -> dict:
 
 
 _R_SESSION = {404: _err("Session not found")}
+_R_UPSTREAM = {
+    429: _err("Too many upstream calls in flight"),
+    503: _err("Upstream Akinator API is failing; circuit open"),
+    504: _err("Not answered within the request's Request-Timeout"),
+}
 _R_ENGINE = {
-    408: _err("Akinator session timed out"),
+    408: _err("Session expired or Akinator session timed out"),
     502: _err("Upstream Akinator API error"),
+    **_R_UPSTREAM,
 }
 
 
@@ -170,22 +490,15 @@ _R_ENGINE = {
     response_model=StartGameResponse,
     status_code=201,
     responses={
+        **_R_UPSTREAM,
         422: _err("Unsupported language code"),
         503: _err("Failed to start a new game"),
     },
 )
-def start_game(body: StartGameRequest) -> StartGameResponse:
+async def start_game(body: StartGameRequest) -> GameJSONResponse:
     """Start a new game session. Returns a `session_id` to use in all later requests."""
-    engine = AkinatorEngine()
-    try:
-        state = engine.start_game(body.language)
-    except EngineError as e:
-        raise _engine_exc_to_http(e) from e
-    session_id = str(uuid.uuid4())
-    _sessions[session_id] = engine
-    return StartGameResponse(
-        session_id=session_id, state=GameStateOut.from_state(state)
-    )
+    session_id, state = await _start_game(body.language)
+    return GameJSONResponse({"session_id": session_id, "state": state}, status_code=201)
 
 
 @app.post(
@@ -193,14 +506,25 @@ def start_game(body: StartGameRequest) -> StartGameResponse:
     response_model=StateResponse,
     responses={**_R_SESSION, **_R_ENGINE, 400: _err("Unknown answer key")},
 )
-def answer(session_id: str, body: AnswerRequest) -> StateResponse:
+async def answer(session_id: str, body: AnswerRequest) -> GameJSONResponse:
     """Submit an answer to the current question."""
-    engine = _get_session(session_id)
-    try:
-        state = engine.answer(body.key)
-    except EngineError as e:
-        raise _engine_exc_to_http(e) from e
-    return StateResponse(state=GameStateOut.from_state(state))
+    (state,) = await _answer_keys(session_id, [body.key])
+    return GameJSONResponse({"state": state})
+
+
+@app.post(
+    "/games/{session_id}/answers",
+    response_model=StatesResponse,
+    responses={**_R_SESSION, **_R_ENGINE, 400: _err("Unknown answer key")},
+)
+async def answer_many(session_id: str, body: AnswersRequest) -> GameJSONResponse:
+    """Submit several answers in order in one call.
+
+    Stops early once Akinator makes a guess or the game ends. If an answer
+    fails, the ones before it stay applied, and the error's ``detail`` lists
+    their ``states``.
+    """
+    return GameJSONResponse({"states": await _answer_keys(session_id, body.keys)})
 
 
 @app.post(
@@ -208,14 +532,9 @@ def answer(session_id: str, body: AnswerRequest) -> StateResponse:
     response_model=StateResponse,
     responses={**_R_SESSION, **_R_ENGINE, 409: _err("Already at the first question")},
 )
-def back(session_id: str) -> StateResponse:
+async def back(session_id: str) -> GameJSONResponse:
     """Undo the last answer and return to the previous question."""
-    engine = _get_session(session_id)
-    try:
-        state = engine.back()
-    except EngineError as e:
-        raise _engine_exc_to_http(e) from e
-    return StateResponse(state=GameStateOut.from_state(state))
+    return GameJSONResponse({"state": await _play(session_id, "back")})
 
 
 @app.post(
@@ -223,14 +542,9 @@ def back(session_id: str) -> StateResponse:
     response_model=StateResponse,
     responses={**_R_SESSION, **_R_ENGINE},
 )
-def choose(session_id: str) -> StateResponse:
+async def choose(session_id: str) -> GameJSONResponse:
     """Accept Akinator's guess - the game ends as a win."""
-    engine = _get_session(session_id)
-    try:
-        state = engine.choose()
-    except EngineError as e:
-        raise _engine_exc_to_http(e) from e
-    return StateResponse(state=GameStateOut.from_state(state))
+    return GameJSONResponse({"state": await _play(session_id, "choose")})
 
 
 @app.post(
@@ -238,18 +552,146 @@ def choose(session_id: str) -> StateResponse:
     response_model=StateResponse,
     responses={**_R_SESSION, **_R_ENGINE},
 )
-def exclude(session_id: str) -> StateResponse:
+async def exclude(session_id: str) -> GameJSONResponse:
     """Reject Akinator's guess - the game continues with more questions."""
-    engine = _get_session(session_id)
+    return GameJSONResponse({"state": await _play(session_id, "exclude")})
+
+
+# --------------------------------------------------------------------------- #
+# WebSocket channel                                                           #
+# --------------------------------------------------------------------------- #
+
+# Commands that need a game on the channel.
+_CHANNEL_OPS = {"answer", "answers", "back", "choose", "exclude"}
+
+
+async def _channel_command(
+    message: dict[str, Any], session_id: str | None
+) -> tuple[str | None, dict[str, Any]]:
+    op = message.get("op")
+    if op == "ping":
+        return session_id, {"op": "pong"}
+    if op == "start":
+        session_id, state = await _start_game(str(message.get("language", "en")))
+        return session_id, {"session_id": session_id, "state": state}
+    if op not in _CHANNEL_OPS:
+        raise _channel_error(400, "InvalidMessage", f"Unknown op {op!r}")
+    if session_id is None:
+        raise _channel_error(
+            404, "SessionNotFound", "No game on this channel yet; send start first"
+        )
+    if op == "answer":
+        (state,) = await _answer_keys(session_id, [str(message.get("key", ""))])
+        return session_id, {"state": state}
+    if op == "answers":
+        keys = message.get("keys")
+        if not isinstance(keys, list) or not keys:
+            raise _channel_error(400, "InvalidMessage", "answers needs keys")
+        states = await _answer_keys(session_id, [str(key) for key in keys])
+        return session_id, {"states": states}
+    return session_id, {"state": await _play(session_id, op)}
+
+
+def _channel_error(status: int, error: str, message: str) -> HTTPException:
+    return HTTPException(
+        status_code=status, detail={"error": error, "message": message}
+    )
+
+
+async def _channel_reply(
+    raw: str, session_id: str | None
+) -> tuple[str | None, dict[str, Any]]:
     try:
-        state = engine.exclude()
-    except EngineError as e:
-        raise _engine_exc_to_http(e) from e
-    return StateResponse(state=GameStateOut.from_state(state))
+        message = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        message = None
+    if not isinstance(message, dict):
+        error = {"error": "InvalidMessage", "message": "Expected a JSON object"}
+        return session_id, {"status": 400, "error": error}
+    try:
+        session_id, reply = await _channel_command(message, session_id)
+    except HTTPException as e:
+        reply = {"status": e.status_code, "error": e.detail}
+        if e.headers and "Retry-After" in e.headers:
+            reply["retry_after"] = int(e.headers["Retry-After"])
+    if "id" in message:
+        reply["id"] = message["id"]
+    return session_id, reply
+
+
+@app.websocket("/games/ws")
+async def game_channel(websocket: WebSocket, session_id: str | None = None) -> None:
+    """One connection for a whole game, instead of one request per answer.
+
+    Each text frame from the client is a JSON command: ``start`` (with
+    ``language``), ``answer`` (``key``), ``answers`` (``keys``), ``back``,
+    ``choose``, ``exclude`` or ``ping``. Each gets exactly one reply, in
+    order, echoing the command's ``id`` if it had one: the same body the
+    HTTP route returns, an ``error`` with its HTTP ``status``, or ``pong``.
+    Connecting with ``?session_id=`` resumes that game and starts with a
+    frame holding its current state. A channel with no frames from the
+    client for ``ws_idle_timeout`` seconds is closed; the game stays in the
+    store and can be resumed.
+    """
+    await websocket.accept()
+    _channels.add(websocket)
+    try:
+        if session_id is not None:
+            try:
+                state = (await _get_session(session_id)).snapshot()
+            except HTTPException as e:
+                await websocket.send_text(
+                    orjson.dumps({"status": e.status_code, "error": e.detail}).decode()
+                )
+                await websocket.close(code=1008, reason="unknown session")
+                return
+            await websocket.send_text(
+                orjson.dumps({"session_id": session_id, "state": state}).decode()
+            )
+        while True:
+            try:
+                raw = await asyncio.wait_for(
+                    websocket.receive_text(), settings.ws_idle_timeout
+                )
+            except TimeoutError:
+                await websocket.close(code=1000, reason="idle")
+                return
+            phases = timing.begin()
+            start = time.perf_counter()
+            session_id, reply = await _channel_reply(raw, session_id)
+            if settings.server_timing:
+                reply["timing"] = timing.breakdown(phases, time.perf_counter() - start)
+            await websocket.send_text(orjson.dumps(reply).decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _channels.discard(websocket)
 
 
 def start() -> None:
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if settings.shards > 1:
+        import router
+
+        router.run()
+        return
+    if settings.workers > 1:
+        if settings.session_backend == "memory":
+            raise SystemExit(
+                "AKIN_WORKERS > 1 needs a shared session store (AKIN_SESSION_BACKEND=sqlite)"
+            )
+        if settings.journal_path:
+            # Workers would append to, and compact over, the same file.
+            raise SystemExit(
+                "AKIN_JOURNAL_PATH needs AKIN_WORKERS=1; use AKIN_SHARDS to scale out"
+            )
+        uvicorn.run(
+            "server:app",
+            host=settings.host,
+            port=settings.port,
+            workers=settings.workers,
+        )
+        return
+    uvicorn.run(app, host=settings.host, port=settings.port)
 
 
 if __name__ == "__main__":
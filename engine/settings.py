@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, fields
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Engine tuning knobs.
+
+    Every field can be overridden with an ``AKIN_<FIELD>`` environment
+    variable, e.g. ``AKIN_UPSTREAM_POOL_SIZE=64``.
+    """
+
+    # Game backend: "akinator" (akinator.com) or "local" (needs numpy)
+    backend: str = "akinator"
+    local_data: str = "data/characters.json"
+    local_max_questions: int = 25
+    local_guess_threshold: float = 0.85
+    local_max_guesses: int = 3
+
+    # Upstream transport
+    upstream_url: str = ""
+    upstream_pool_size: int = 32
+    upstream_max_idle: float = 60.0
+
+    # Upstream call policy
+    upstream_timeout: float = 10.0
+    upstream_retries: int = 2
+    upstream_backoff: float = 0.1
+    upstream_backoff_max: float = 1.0
+    upstream_hedge: bool = False
+    upstream_hedge_quantile: float = 0.95
+    upstream_hedge_min_delay: float = 0.05
+
+    # Circuit breaker and adaptive in-flight limit on upstream calls
+    breaker_threshold: int = 5
+    breaker_reset_timeout: float = 10.0
+    limit_initial: int = 64
+    limit_min: int = 4
+    limit_max: int = 512
+    limit_latency_target: float = 2.0
+    limit_start_reserve: float = 0.2
+    limit_speculate_reserve: float = 0.5
+    # Upstream calls per second across the engine (0 disables), split evenly
+    # between shards; calls over it queue up to max wait, and are let through
+    # games in progress ("play") to new games ("start") by these weights
+    upstream_rate: float = 0.0
+    upstream_burst: int = 10
+    upstream_max_wait: float = 2.0
+    upstream_play_weight: int = 4
+    upstream_start_weight: int = 1
+
+    # Per-client token buckets on game commands, a second (0 disables); a
+    # client is its key header, else its address (from ip header if set)
+    client_rate: float = 0.0
+    client_burst: int = 20
+    client_start_rate: float = 0.0
+    client_start_burst: int = 5
+    client_key_header: str = "x-api-key"
+    client_ip_header: str = ""
+    client_capacity: int = 100_000
+
+    # Session store ("memory" or "sqlite")
+    session_backend: str = "memory"
+    session_db_path: str = "sessions.db"
+    session_capacity: int = 10_000
+    session_ttl: float = 1800.0
+    session_sweep_interval: float = 30.0
+    # Commands that may wait behind a running one on the same game
+    session_queue_depth: int = 16
+    # Memory backend: move sessions idle this long (0 disables) to SQLite,
+    # in memory or, with a path, on disk
+    session_hibernate_after: float = 0.0
+    session_hibernate_path: str = ""
+    # Append-only journal of game events, replayed on startup ("" disables);
+    # fsync'd in batches every flush interval, compacted every compact bytes
+    journal_path: str = ""
+    journal_flush_interval: float = 0.05
+    journal_compact_bytes: int = 64 * 1024 * 1024
+
+    # Pre-warmed games for POST /games (comma-separated language codes); off
+    # by default, since idle games cost upstream sessions
+    prewarm_size: int = 0
+    prewarm_languages: str = "en"
+    prewarm_max_age: float = 300.0
+    prewarm_refill_interval: float = 5.0
+
+    # Speculative prefetch of all five answers to each served question
+    prefetch_enabled: bool = False
+    prefetch_concurrency: int = 100
+    prefetch_max_sessions: int = 1000
+
+    # Trie of (language, answer path) -> state from live games (0 disables)
+    path_cache_size: int = 0
+
+    # Responses to mutating requests kept per Idempotency-Key (0 disables)
+    idempotency_cache_size: int = 10_000
+    idempotency_ttl: float = 600.0
+
+    # Server
+    host: str = "0.0.0.0"
+    port: int = 8000
+    server_timing: bool = True
+    # Deadline for game requests that send no Request-Timeout header (0: none)
+    request_timeout: float = 0.0
+    ws_idle_timeout: float = 60.0
+    workers: int = 1
+    # Worker processes behind a built-in router, each owning the sessions it
+    # started (1 disables); AKIN_SHARD is set by the router for each worker
+    shards: int = 1
+    shard_socket_dir: str = ""
+    shard: int = -1
+
+    @classmethod
+    def from_env(cls) -> Settings:
+        overrides = {}
+        for f in fields(cls):
+            raw = os.environ.get(f"AKIN_{f.name.upper()}")
+            if raw is None:
+                continue
+            kind = type(f.default)
+            if kind is bool:
+                overrides[f.name] = raw.strip().lower() in ("1", "true", "yes", "on")
+            else:
+                overrides[f.name] = kind(raw)
+        return cls(**overrides)
+
+
+settings = Settings.from_env()
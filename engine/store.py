@@ -0,0 +1,513 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import math
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Generic, Protocol, Self, TypeVar
+
+from exceptions import SessionTimeoutError
+from metrics import (
+    session_hibernations,
+    session_rehydrate_latency,
+    session_rehydrations,
+)
+from settings import Settings
+
+T = TypeVar("T")
+
+
+class StoredState(Protocol):
+    """A backend's game state (UpstreamState, LocalState) as the store sees it."""
+
+    @property
+    def finished(self) -> bool: ...
+
+    def to_dict(self) -> dict[str, Any]: ...
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self: ...
+
+
+class SessionStore(Protocol):
+    """Where game state lives between requests.
+
+    ``get`` returns None for IDs it has never seen and raises
+    SessionTimeoutError for ones that expired or were evicted.
+    """
+
+    def __len__(self) -> int: ...
+
+    async def add(self, session_id: str, value: StoredState) -> None: ...
+
+    async def get(self, session_id: str) -> StoredState | None: ...
+
+    async def pop(self, session_id: str) -> StoredState | None: ...
+
+    async def sweep(self) -> int: ...
+
+    def start_sweeper(self) -> None: ...
+
+    async def aclose(self) -> None: ...
+
+
+class _Sweeper(ABC):
+    _sweep_interval: float
+    # A sweep that dropped this many sessions may have left some: sweep again
+    # once other tasks have had a turn.
+    _sweep_batch: float = math.inf
+    _sweeper: asyncio.Task | None = None
+
+    @abstractmethod
+    async def sweep(self) -> int: ...
+
+    def start_sweeper(self) -> None:
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self._sweep_interval)
+            while await self.sweep() >= self._sweep_batch:
+                await asyncio.sleep(0)
+
+    async def aclose(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._sweeper
+            self._sweeper = None
+
+
+class _Entry(Generic[T]):
+    __slots__ = ("last_used", "value")
+
+    def __init__(self, value: T, last_used: float) -> None:
+        self.value = value
+        self.last_used = last_used
+
+
+class MemorySessionStore(_Sweeper, Generic[T]):
+    """Bounded LRU map of sessions with an idle TTL, local to this process.
+
+    Entries are kept in last-used order, so the oldest entry is always at the
+    front: sweeping stops at the first live entry and costs O(expired).
+    IDs of expired or evicted sessions are remembered (bounded) so that a late
+    request gets a ``SessionTimeoutError`` rather than looking unknown.
+    """
+
+    def __init__(self, capacity: int, ttl: float, sweep_interval: float) -> None:
+        self._capacity = capacity
+        self._ttl = ttl
+        self._sweep_interval = sweep_interval
+        self._entries: OrderedDict[str, _Entry[T]] = OrderedDict()
+        self._expired: OrderedDict[str, None] = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    async def add(self, session_id: str, value: T) -> None:
+        self._entries[session_id] = _Entry(value, time.monotonic())
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self._capacity:
+            oldest, _ = self._entries.popitem(last=False)
+            self._tombstone(oldest)
+            self.evictions += 1
+
+    async def get(self, session_id: str) -> T | None:
+        """Return the session and mark it used, or None if it never existed.
+
+        Raises SessionTimeoutError if the session existed but has expired.
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            if session_id in self._expired:
+                raise SessionTimeoutError(f"Session {session_id!r} has expired")
+            return None
+        now = time.monotonic()
+        if now - entry.last_used > self._ttl:
+            del self._entries[session_id]
+            self._tombstone(session_id)
+            self.expirations += 1
+            raise SessionTimeoutError(f"Session {session_id!r} has expired")
+        entry.last_used = now
+        self._entries.move_to_end(session_id)
+        return entry.value
+
+    async def pop(self, session_id: str) -> T | None:
+        entry = self._entries.pop(session_id, None)
+        return None if entry is None else entry.value
+
+    async def sweep(self) -> int:
+        """Drop every expired session and return how many were dropped."""
+        deadline = time.monotonic() - self._ttl
+        swept = 0
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if entry.last_used > deadline:
+                break
+            del self._entries[session_id]
+            self._tombstone(session_id)
+            swept += 1
+        self.expirations += swept
+        return swept
+
+    def _tombstone(self, session_id: str) -> None:
+        self._expired[session_id] = None
+        while len(self._expired) > self._capacity:
+            self._expired.popitem(last=False)
+
+
+class SQLiteSessionStore(_Sweeper):
+    """Session state in a local SQLite file, shared by every worker on the box.
+
+    Same contract as MemorySessionStore, but timestamps are wall-clock so that
+    separate processes agree on expiry. Triggers keep a row count, so neither
+    ``len`` nor enforcing capacity scans the table. Every statement runs on
+    one worker thread, off the event loop and in the order calls were made;
+    ``len`` is the count as of the last call. A sweep touches at most the
+    ``_sweep_batch`` oldest expired or over-capacity sessions along with as
+    many old tombstones.
+    """
+
+    _sweep_batch = 1000
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int,
+        ttl: float,
+        sweep_interval: float,
+        state_type: type[StoredState],
+    ) -> None:
+        self._path = path
+        self._state_type = state_type
+        self._capacity = capacity
+        self._ttl = ttl
+        self._sweep_interval = sweep_interval
+        self._conn: sqlite3.Connection | None = None
+        self._worker: ThreadPoolExecutor | None = None
+        self._count = 0
+
+    async def _run(self, call: Callable[..., T], *args: Any) -> T:
+        # One thread, because a connection cannot be shared between threads
+        # in the middle of a transaction.
+        if self._worker is None:
+            self._worker = ThreadPoolExecutor(1, thread_name_prefix="session-store")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._worker, self._counted, call, *args)
+
+    def _counted(self, call: Callable[..., T], *args: Any) -> T:
+        try:
+            return call(*args)
+        finally:
+            (self._count,) = self.conn.execute("SELECT n FROM session_count").fetchone()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened lazily so each worker process gets its own connection.
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self._path, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_updated_at
+                    ON sessions (updated_at);
+                CREATE TABLE IF NOT EXISTS expired (
+                    id TEXT PRIMARY KEY,
+                    expired_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS expired_expired_at
+                    ON expired (expired_at);
+                BEGIN IMMEDIATE;
+                CREATE TABLE IF NOT EXISTS session_count (n INTEGER NOT NULL);
+                INSERT INTO session_count (n)
+                    SELECT COUNT(*) FROM sessions
+                    WHERE NOT EXISTS (SELECT 1 FROM session_count);
+                CREATE TRIGGER IF NOT EXISTS sessions_inserted
+                    AFTER INSERT ON sessions
+                    BEGIN UPDATE session_count SET n = n + 1; END;
+                CREATE TRIGGER IF NOT EXISTS sessions_deleted
+                    AFTER DELETE ON sessions
+                    BEGIN UPDATE session_count SET n = n - 1; END;
+                COMMIT;
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def __len__(self) -> int:
+        return self._count
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    async def add(
+        self, session_id: str, value: StoredState, used_at: float | None = None
+    ) -> None:
+        await self._run(self._add, session_id, value, used_at)
+
+    def _add(self, session_id: str, value: StoredState, used_at: float | None) -> None:
+        # An upsert, not INSERT OR REPLACE: a replace deletes the old row
+        # without firing the trigger that counts it.
+        self.conn.execute(
+            "INSERT INTO sessions (id, state, updated_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (id) DO UPDATE"
+            " SET state = excluded.state, updated_at = excluded.updated_at",
+            (
+                session_id,
+                json.dumps(value.to_dict()),
+                time.time() if used_at is None else used_at,
+            ),
+        )
+
+    async def get(self, session_id: str) -> StoredState | None:
+        return await self._run(self._get, session_id)
+
+    def _get(self, session_id: str) -> StoredState | None:
+        conn = self.conn
+        row = conn.execute(
+            "SELECT state, updated_at FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            expired = conn.execute(
+                "SELECT 1 FROM expired WHERE id = ?", (session_id,)
+            ).fetchone()
+            if expired:
+                raise SessionTimeoutError(f"Session {session_id!r} has expired")
+            return None
+        state, updated_at = row
+        now = time.time()
+        if now - updated_at > self._ttl:
+            self._expire(session_id)
+            raise SessionTimeoutError(f"Session {session_id!r} has expired")
+        conn.execute(
+            "UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id)
+        )
+        return self._state_type.from_dict(json.loads(state))
+
+    async def expire(self, session_id: str) -> None:
+        """Drop the session, remembering that it expired."""
+        await self._run(self._expire, session_id)
+
+    def _expire(self, session_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO expired (id, expired_at) VALUES (?, ?)",
+                (session_id, time.time()),
+            )
+
+    async def pop(self, session_id: str) -> StoredState | None:
+        return await self._run(self._pop, session_id)
+
+    def _pop(self, session_id: str) -> StoredState | None:
+        row = self.conn.execute(
+            "DELETE FROM sessions WHERE id = ? RETURNING state", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self._state_type.from_dict(json.loads(row[0]))
+
+    async def sweep(self) -> int:
+        """Drop up to ``_sweep_batch`` sessions, expired or over capacity."""
+        return await self._run(self._sweep)
+
+    def _sweep(self) -> int:
+        now = time.time()
+        cutoff = now - self._ttl
+        batch = self._sweep_batch
+        with self._transaction() as conn:
+            ids = conn.execute(
+                "SELECT id FROM sessions WHERE updated_at <= ?"
+                " ORDER BY updated_at LIMIT ?",
+                (cutoff, batch),
+            ).fetchall()
+            (count,) = conn.execute("SELECT n FROM session_count").fetchone()
+            overflow = min(count - len(ids) - self._capacity, batch - len(ids))
+            if overflow > 0:
+                ids += conn.execute(
+                    "SELECT id FROM sessions WHERE updated_at > ?"
+                    " ORDER BY updated_at LIMIT ?",
+                    (cutoff, overflow),
+                ).fetchall()
+            conn.executemany("DELETE FROM sessions WHERE id = ?", ids)
+            conn.executemany(
+                "INSERT OR REPLACE INTO expired (id, expired_at) VALUES (?, ?)",
+                [(session_id, now) for (session_id,) in ids],
+            )
+            conn.execute(
+                "DELETE FROM expired WHERE id IN"
+                " (SELECT id FROM expired WHERE expired_at <= ? LIMIT ?)",
+                (cutoff, batch),
+            )
+        return len(ids)
+
+    async def aclose(self) -> None:
+        await super().aclose()
+        if self._worker is None:
+            return
+        if self._conn is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                self._worker, self._conn.close
+            )
+            self._conn = None
+        self._worker.shutdown()
+        self._worker = None
+
+
+class TieredSessionStore(_Sweeper):
+    """Recently used sessions in memory, idle ones hibernated to SQLite.
+
+    A session idle for ``hibernate_after`` seconds, or pushed out of the
+    ``capacity`` most recently used, is serialized into ``cold`` and dropped
+    from the heap; the next ``get`` moves it back. Expiry, capacity and
+    tombstones of hibernated sessions are ``cold``'s job, and it is handed
+    the real last-use time, so the TTL still runs from the last request. A
+    session still in memory past ``ttl``, when ``hibernate_after`` is longer
+    or the sweep has yet to run, is expired on ``get`` the same way.
+    """
+
+    _sweep_batch = SQLiteSessionStore._sweep_batch
+
+    def __init__(
+        self,
+        capacity: int,
+        ttl: float,
+        hibernate_after: float,
+        sweep_interval: float,
+        cold: SQLiteSessionStore,
+        spill_on_close: bool = False,
+    ) -> None:
+        self._capacity = capacity
+        self._ttl = ttl
+        self._hibernate_after = hibernate_after
+        self._sweep_interval = sweep_interval
+        self._cold = cold
+        self._spill_on_close = spill_on_close
+        self._hot: OrderedDict[str, _Entry[StoredState]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._hot) + len(self._cold)
+
+    @property
+    def hibernated(self) -> int:
+        return len(self._cold)
+
+    async def _hibernate_oldest(self) -> None:
+        session_id, entry = self._hot.popitem(last=False)
+        idle = time.monotonic() - entry.last_used
+        await self._cold.add(session_id, entry.value, used_at=time.time() - idle)
+        session_hibernations.inc()
+
+    async def add(self, session_id: str, value: StoredState) -> None:
+        self._hot[session_id] = _Entry(value, time.monotonic())
+        self._hot.move_to_end(session_id)
+        while len(self._hot) > self._capacity:
+            await self._hibernate_oldest()
+
+    async def get(self, session_id: str) -> StoredState | None:
+        entry = self._hot.get(session_id)
+        if entry is not None:
+            now = time.monotonic()
+            if now - entry.last_used > self._ttl:
+                del self._hot[session_id]
+                await self._cold.expire(session_id)
+                raise SessionTimeoutError(f"Session {session_id!r} has expired")
+            entry.last_used = now
+            self._hot.move_to_end(session_id)
+            return entry.value
+        start = time.perf_counter()
+        value = await self._cold.get(session_id)
+        if value is None:
+            return None
+        await self._cold.pop(session_id)
+        await self.add(session_id, value)
+        session_rehydrate_latency.observe(time.perf_counter() - start)
+        session_rehydrations.inc()
+        return value
+
+    async def pop(self, session_id: str) -> StoredState | None:
+        entry = self._hot.pop(session_id, None)
+        if entry is not None:
+            return entry.value
+        return await self._cold.pop(session_id)
+
+    async def sweep(self) -> int:
+        """Hibernate idle sessions, then expire hibernated ones."""
+        deadline = time.monotonic() - self._hibernate_after
+        while self._hot and next(iter(self._hot.values())).last_used <= deadline:
+            await self._hibernate_oldest()
+        return await self._cold.sweep()
+
+    async def aclose(self) -> None:
+        await super().aclose()
+        if self._spill_on_close:
+            # Hibernated to a file, every session survives a restart.
+            while self._hot:
+                await self._hibernate_oldest()
+        await self._cold.aclose()
+
+
+def make_session_store(
+    settings: Settings, state_type: type[StoredState]
+) -> SessionStore:
+    if settings.session_backend == "memory" and settings.session_hibernate_after > 0:
+        path = settings.session_hibernate_path
+        return TieredSessionStore(
+            capacity=settings.session_capacity,
+            ttl=settings.session_ttl,
+            hibernate_after=settings.session_hibernate_after,
+            sweep_interval=settings.session_sweep_interval,
+            cold=SQLiteSessionStore(
+                path=path or ":memory:",
+                capacity=settings.session_capacity,
+                ttl=settings.session_ttl,
+                sweep_interval=settings.session_sweep_interval,
+                state_type=state_type,
+            ),
+            spill_on_close=bool(path),
+        )
+    if settings.session_backend == "memory":
+        return MemorySessionStore(
+            capacity=settings.session_capacity,
+            ttl=settings.session_ttl,
+            sweep_interval=settings.session_sweep_interval,
+        )
+    if settings.session_backend == "sqlite":
+        return SQLiteSessionStore(
+            path=settings.session_db_path,
+            capacity=settings.session_capacity,
+            ttl=settings.session_ttl,
+            sweep_interval=settings.session_sweep_interval,
+            state_type=state_type,
+        )
+    raise ValueError(f"Unknown session backend {settings.session_backend!r}")
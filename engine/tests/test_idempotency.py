@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from idempotency import IdempotencyCache, IdempotencyMiddleware
+
+
+def _app(status: int = 200, delay: float = 0.0) -> tuple[Starlette, list[bytes]]:
+    calls: list[bytes] = []
+
+    async def answer(request: Request) -> JSONResponse:
+        calls.append(await request.body())
+        await asyncio.sleep(delay)
+        return JSONResponse({"call": len(calls)}, status_code=status)
+
+    app = Starlette(routes=[Route("/games/{sid}/answer", answer, methods=["POST"])])
+    app.add_middleware(IdempotencyMiddleware, cache=IdempotencyCache(100, 60.0))
+    return app, calls
+
+
+def _post(app: Starlette, *requests: tuple[str, dict]) -> list[httpx.Response]:
+    async def main() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return list(
+                await asyncio.gather(
+                    *(
+                        c.post(
+                            "/games/a/answer",
+                            json=body,
+                            headers={"Idempotency-Key": key},
+                        )
+                        for key, body in requests
+                    )
+                )
+            )
+
+    return asyncio.run(main())
+
+
+def test_replays_a_completed_key() -> None:
+    app, calls = _app()
+    (first,) = _post(app, ("k1", {"key": "y"}))
+    (again,) = _post(app, ("k1", {"key": "y"}))
+
+    assert len(calls) == 1
+    assert again.status_code == 200
+    assert again.json() == first.json() == {"call": 1}
+    assert again.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+
+def test_rejects_a_key_reused_with_another_body() -> None:
+    app, calls = _app()
+    _post(app, ("k1", {"key": "y"}))
+    (conflict,) = _post(app, ("k1", {"key": "n"}))
+
+    assert len(calls) == 1
+    assert conflict.status_code == 422
+    assert conflict.json()["detail"]["error"] == "IdempotencyKeyReused"
+
+
+def test_duplicate_in_flight_waits_for_the_original() -> None:
+    app, calls = _app(delay=0.05)
+    first, second = _post(app, ("k1", {"key": "y"}), ("k1", {"key": "y"}))
+
+    assert len(calls) == 1
+    assert first.json() == second.json()
+    assert second.headers["idempotent-replayed"] == "true"
+
+
+def test_distinct_keys_each_run() -> None:
+    app, calls = _app()
+    _post(app, ("k1", {"key": "y"}), ("k2", {"key": "y"}))
+
+    assert len(calls) == 2
+
+
+def test_retryable_failures_are_not_stored() -> None:
+    app, calls = _app(status=503)
+    _post(app, ("k1", {"key": "y"}))
+    (retry,) = _post(app, ("k1", {"key": "y"}))
+
+    assert len(calls) == 2
+    assert "idempotent-replayed" not in retry.headers
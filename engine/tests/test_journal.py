@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from engine import GameState
+from journal import Journal, fold
+from pathcache import PathState
+
+
+def _state(step: int, finished: bool = False) -> PathState:
+    game = GameState(
+        question=f"Question {step}",
+        step=step,
+        progression=float(step),
+        win=finished,
+        finished=finished,
+        name_proposition=None,
+        description_proposition=None,
+    )
+    return PathState(language="en", path="y" * step, game=game)
+
+
+def _journal(path: Path) -> Journal:
+    return Journal(
+        path=str(path),
+        state_type=PathState,
+        ttl=3600.0,
+        flush_interval=60.0,
+        compact_bytes=1 << 30,
+    )
+
+
+def _write(path: Path, games: dict[str, int], finished: set[str]) -> None:
+    async def main() -> None:
+        journal = _journal(path)
+        journal.start()
+        for session_id, steps in games.items():
+            journal.record(session_id, "start", "en", _state(0))
+            for step in range(1, steps + 1):
+                over = session_id in finished and step == steps
+                journal.record(session_id, "answer", "y", _state(step, over))
+        await journal.aclose()
+
+    asyncio.run(main())
+
+
+def test_fold_drops_finished_games(tmp_path: Path) -> None:
+    path = tmp_path / "journal.log"
+    _write(path, {"live": 3, "over": 2}, finished={"over"})
+
+    games = fold(path, PathState, ttl=3600.0)
+
+    assert list(games) == ["live"]
+    assert games["live"].ops == [["answer", "y"]] * 3
+
+
+def test_fold_drops_expired_games(tmp_path: Path) -> None:
+    path = tmp_path / "journal.log"
+    _write(path, {"live": 1}, finished=set())
+
+    assert fold(path, PathState, ttl=3600.0, now=0.0)
+    assert not fold(path, PathState, ttl=3600.0, now=1e12)
+
+
+def test_fold_skips_a_torn_last_line(tmp_path: Path) -> None:
+    path = tmp_path / "journal.log"
+    _write(path, {"live": 2}, finished=set())
+    with path.open("ab") as f:
+        f.write(b'{"s":"live","t":1e12,"op":"answer","k":"n","st":{"lang')
+
+    assert fold(path, PathState, ttl=3600.0)["live"].ops == [["answer", "y"]] * 2
+
+
+def test_restart_compacts_to_live_games(tmp_path: Path) -> None:
+    path = tmp_path / "journal.log"
+    _write(path, {"live": 5, "over": 4}, finished={"over"})
+    before = path.stat().st_size
+
+    async def restart() -> tuple[Journal, PathState | None, PathState | None]:
+        journal = _journal(path)
+        journal.start()
+        try:
+            return journal, journal.reattach("live"), journal.reattach("over")
+        finally:
+            await journal.aclose()
+
+    journal, live, over = asyncio.run(restart())
+
+    assert journal.compactions == 1
+    assert path.stat().st_size < before
+    assert over is None
+    assert live == _state(5)
+    assert len(path.read_bytes().splitlines()) == 1
+    assert list(fold(path, PathState, ttl=3600.0)) == ["live"]
+
+
+def test_failed_flush_keeps_the_batch(tmp_path: Path, monkeypatch) -> None:
+    path = tmp_path / "journal.log"
+
+    async def main() -> None:
+        journal = _journal(path)
+        journal.start()
+        journal.record("live", "start", "en", _state(0))
+        journal.record("live", "answer", "y", _state(1))
+
+        def short_write(fd: int, data: bytes) -> int:
+            monkeypatch.undo()
+            os.write(fd, data[:10])
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr(os, "write", short_write)
+        with pytest.raises(OSError):
+            await journal.flush()
+        journal.record("live", "answer", "n", _state(2))
+        await journal.aclose()
+
+    asyncio.run(main())
+
+    assert fold(path, PathState, ttl=3600.0)["live"].ops == [
+        ["answer", "y"],
+        ["answer", "n"],
+    ]
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from exceptions import OverloadedError
+from lanes import SessionLanes
+
+
+async def _command(
+    lanes: SessionLanes, session_id: str, name: str, log: list[str]
+) -> None:
+    async with lanes.turn(session_id):
+        log.append(f"{name} start")
+        await asyncio.sleep(0.01)
+        log.append(f"{name} end")
+
+
+def test_commands_on_one_session_run_in_arrival_order() -> None:
+    async def main() -> list[str]:
+        lanes = SessionLanes(max_depth=16)
+        log: list[str] = []
+        await asyncio.gather(*(_command(lanes, "a", str(i), log) for i in range(4)))
+        assert lanes.stats()["busy"] == 0
+        return log
+
+    assert asyncio.run(main()) == [
+        event for i in range(4) for event in (f"{i} start", f"{i} end")
+    ]
+
+
+def test_sessions_do_not_wait_on_each_other() -> None:
+    async def main() -> list[str]:
+        lanes = SessionLanes(max_depth=16)
+        log: list[str] = []
+        await asyncio.gather(
+            _command(lanes, "a", "a", log), _command(lanes, "b", "b", log)
+        )
+        return log
+
+    assert asyncio.run(main())[:2] == ["a start", "b start"]
+
+
+def test_a_full_queue_turns_commands_away() -> None:
+    async def main() -> None:
+        lanes = SessionLanes(max_depth=1)
+        log: list[str] = []
+        running = asyncio.gather(
+            _command(lanes, "a", "0", log), _command(lanes, "a", "1", log)
+        )
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError):
+            await _command(lanes, "a", "2", log)
+        await running
+        assert lanes.rejected == 1
+        assert log == ["0 start", "0 end", "1 start", "1 end"]
+
+    asyncio.run(main())
+
+
+def test_a_cancelled_waiter_gives_up_its_place() -> None:
+    async def main() -> None:
+        lanes = SessionLanes(max_depth=16)
+        log: list[str] = []
+        first = asyncio.create_task(_command(lanes, "a", "0", log))
+        second = asyncio.create_task(_command(lanes, "a", "1", log))
+        third = asyncio.create_task(_command(lanes, "a", "2", log))
+        await asyncio.sleep(0)
+        second.cancel()
+        await asyncio.gather(first, third)
+        assert second.cancelled()
+        assert log == ["0 start", "0 end", "2 start", "2 end"]
+        assert lanes.stats()["busy"] == 0
+
+    asyncio.run(main())
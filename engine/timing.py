@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Seconds spent per phase by the request being handled, if any.
+_phases: ContextVar[dict[str, float] | None] = ContextVar("phases", default=None)
+
+PHASES = ("upstream", "wait", "serialize")
+
+
+class _Phase:
+    # A plain class rather than @contextmanager: this wraps every response
+    # encode, where a generator-based context manager costs as much as the
+    # encoding itself.
+    __slots__ = ("_name", "_phases", "_start")
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __enter__(self) -> None:
+        self._phases = _phases.get()
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc: object) -> None:
+        phases = self._phases
+        if phases is not None:
+            name = self._name
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - self._start
+
+
+def phase(name: str) -> _Phase:
+    """Add the time spent in the block to ``name`` for the current request."""
+    return _Phase(name)
+
+
+def detach() -> None:
+    """Stop charging work in this task to the request that spawned it."""
+    _phases.set(None)
+
+
+def begin() -> dict[str, float]:
+    """Charge phases in this task to a fresh breakdown, and return it."""
+    phases: dict[str, float] = {}
+    _phases.set(phases)
+    return phases
+
+
+def breakdown(phases: dict[str, float], total: float) -> dict[str, float]:
+    """Milliseconds per phase, plus ``handler`` for the rest and ``total``."""
+    handler = max(0.0, total - sum(phases.values()))
+    parts = {name: phases.get(name, 0.0) for name in PHASES}
+    parts.update(handler=handler, total=total)
+    return {name: round(seconds * 1000, 1) for name, seconds in parts.items()}
+
+
+def render(phases: dict[str, float], total: float) -> str:
+    return ", ".join(
+        f"{name};dur={ms:.1f}" for name, ms in breakdown(phases, total).items()
+    )
+
+
+class ServerTimingMiddleware:
+    """Adds a ``Server-Timing`` header splitting each request into phases.
+
+    ``upstream`` is time in Akinator calls, ``wait`` is time queued behind
+    backoff or in-flight work, ``serialize`` is building response models and
+    ``handler`` is everything else up to the response headers.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        phases: dict[str, float] = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing", render(phases, time.perf_counter() - start)
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _phases.reset(token)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import re
+import time
+
+from curl_cffi import CurlOpt
+from curl_cffi import requests as _curl_requests
+
+from settings import settings
+
+_IMPERSONATE = "chrome120"
+_AKINATOR_URL = re.compile(r"^https://(\w+)\.akinator\.com/")
+
+
+class UpstreamPool:
+    """Process-wide keep-alive transport to akinator.com shared by every game.
+
+    One curl_cffi session holds up to ``size`` libcurl handles whose connections
+    are reused across games. Connections idle for longer than ``max_idle``
+    seconds are dropped by libcurl on next use, and the background reaper closes
+    the whole session once the pool itself has been idle that long.
+
+    With ``base_url`` set, ``https://<lang>.akinator.com/<path>`` is sent to
+    ``<base_url>/<lang>/<path>`` instead, e.g. to the stub in ``bench/``.
+    """
+
+    def __init__(self, size: int, max_idle: float, base_url: str = "") -> None:
+        self._size = size
+        self._max_idle = max_idle
+        self._base_url = base_url.rstrip("/")
+        self._session: _curl_requests.AsyncSession | None = None
+        self._sync_session: _curl_requests.Session | None = None
+        self._in_flight = 0
+        self._last_used = time.monotonic()
+        self._reaper: asyncio.Task | None = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _curl_options(self) -> dict:
+        return {CurlOpt.MAXAGE_CONN: max(1, int(self._max_idle))}
+
+    @property
+    def session(self) -> _curl_requests.AsyncSession:
+        if self._session is None:
+            self._session = _curl_requests.AsyncSession(
+                impersonate=_IMPERSONATE,
+                max_clients=self._size,
+                curl_options=self._curl_options(),
+            )
+        return self._session
+
+    @property
+    def sync_session(self) -> _curl_requests.Session:
+        if self._sync_session is None:
+            self._sync_session = _curl_requests.Session(
+                impersonate=_IMPERSONATE, curl_options=self._curl_options()
+            )
+        return self._sync_session
+
+    def _url(self, url: str) -> str:
+        if not self._base_url:
+            return url
+        return _AKINATOR_URL.sub(rf"{self._base_url}/\1/", url, count=1)
+
+    def game_session(self) -> GameSession:
+        return GameSession(self)
+
+    def sync_game_session(self) -> SyncGameSession:
+        return SyncGameSession(self)
+
+    async def request(self, url: str, cookies: dict, **kwargs):
+        self._in_flight += 1
+        try:
+            return await self.session.post(
+                self._url(url), cookies=cookies, discard_cookies=True, **kwargs
+            )
+        finally:
+            self._in_flight -= 1
+            self._last_used = time.monotonic()
+
+    def sync_request(self, url: str, cookies: dict, **kwargs):
+        self._last_used = time.monotonic()
+        return self.sync_session.post(
+            self._url(url), cookies=cookies, discard_cookies=True, **kwargs
+        )
+
+    async def reap_idle(self) -> bool:
+        """Close the session if nothing has used it for ``max_idle`` seconds."""
+        if self._session is None or self._in_flight:
+            return False
+        if time.monotonic() - self._last_used < self._max_idle:
+            return False
+        session, self._session = self._session, None
+        await session.close()
+        return True
+
+    def start_reaper(self) -> None:
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_forever())
+
+    async def _reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self._max_idle)
+            await self.reap_idle()
+
+    async def aclose(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reaper
+            self._reaper = None
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+        if self._sync_session is not None:
+            session, self._sync_session = self._sync_session, None
+            session.close()
+
+
+class GameSession:
+    """Per-game view of the pool: only the game's cookies live here."""
+
+    def __init__(self, pool: UpstreamPool) -> None:
+        self._pool = pool
+        self.cookies: dict[str, str] = {}
+
+    async def post(self, url: str, **kwargs):
+        response = await self._pool.request(url, self.cookies, **kwargs)
+        self.cookies.update(response.cookies)
+        return response
+
+
+class SyncGameSession:
+    """Blocking counterpart of GameSession for AkinatorEngine."""
+
+    def __init__(self, pool: UpstreamPool) -> None:
+        self._pool = pool
+        self.cookies: dict[str, str] = {}
+
+    def post(self, url: str, **kwargs):
+        response = self._pool.sync_request(url, self.cookies, **kwargs)
+        self.cookies.update(response.cookies)
+        return response
+
+
+pool = UpstreamPool(
+    settings.upstream_pool_size, settings.upstream_max_idle, settings.upstream_url
+)
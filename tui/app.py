@@ -1,21 +1,27 @@
 from __future__ import annotations
 
+from collections.abc import Awaitable, Callable
+
+from rich.markup import escape
+from textual.app import App, ComposeResult
+from textual.binding import Binding
+from textual.widgets import Footer
+from textual.worker import Worker, WorkerState
+
 from client import (
+    AsyncEngineClient,
     CantGoBackError,
-    EngineClient,
+    ChannelClient,
     GameState,
     InvalidAnswerError,
     InvalidLanguageError,
     NetworkError,
+    OverloadedError,
     SessionNotFound,
     SessionTimeoutError,
     StartupError,
+    UpstreamUnavailableError,
 )
-from rich.markup import escape
-from textual.app import App, ComposeResult
-from textual.binding import Binding
-from textual.widgets import Footer
-from textual.worker import Worker, WorkerState
 from widgets import CurrentQuestion, QuestionHistory, StatusBar, WinProposal
 
 
@@ -39,11 +45,16 @@ class AkinatorApp(App):
         language: str = "en",
         debug: bool = False,
         engine_url: str = "http://localhost:8000",
+        transport: str = "ws",
     ) -> None:
         super().__init__()
         self._language = language
         self._debug = debug
-        self._engine = EngineClient(engine_url)
+        self._engine: AsyncEngineClient | ChannelClient = (
+            ChannelClient(engine_url)
+            if transport == "ws"
+            else AsyncEngineClient(engine_url)
+        )
         self._loading = False
         self._game_over = False
         self._awaiting_win = False
@@ -86,47 +97,38 @@ class AkinatorApp(App):
     # Engine workers                                                       #
     # ------------------------------------------------------------------ #
 
-    def _do_start_game(self) -> None:
+    def _run(self, call: Callable[[], Awaitable[GameState]]) -> None:
         self._set_loading(True)
-        self.run_worker(
-            lambda: self._engine.start_game(self._language),
-            thread=True,
-            name="engine",
-            exit_on_error=False,
-        )
+        # Runs on the app's event loop: no thread per keypress.
+        self.run_worker(call(), name="engine", exit_on_error=False)
+
+    def _do_start_game(self) -> None:
+        engine = self._engine
+
+        async def start() -> GameState:
+            # Connect while "Starting..." is up, then reuse it all game.
+            await engine.warm()
+            return await engine.start_game(self._language)
+
+        self._run(start)
 
     def _do_answer(self, key: str) -> None:
         history = self.query_one("#history", QuestionHistory)
         history.append_qa(self._cur_step + 1, self._cur_question, key)
-        self._set_loading(True)
-        self.run_worker(
-            lambda: self._engine.answer(key),
-            thread=True,
-            name="engine",
-            exit_on_error=False,
-        )
+        self._run(lambda: self._engine.answer(key))
 
     def _do_back(self) -> None:
-        self._set_loading(True)
-        self.run_worker(
-            self._engine.back, thread=True, name="engine", exit_on_error=False
-        )
+        self._run(self._engine.back)
 
     def _win_accept(self) -> None:
         history = self.query_one("#history", QuestionHistory)
         history.append_win(self._cur_name, "Correct!")
-        self._set_loading(True)
-        self.run_worker(
-            self._engine.choose, thread=True, name="engine", exit_on_error=False
-        )
+        self._run(self._engine.choose)
 
     def _win_reject(self) -> None:
         history = self.query_one("#history", QuestionHistory)
         history.append_win(self._cur_name, "Nope, keep going...")
-        self._set_loading(True)
-        self.run_worker(
-            self._engine.exclude, thread=True, name="engine", exit_on_error=False
-        )
+        self._run(self._engine.exclude)
 
     # ------------------------------------------------------------------ #
     # Worker result / error                                               #
@@ -151,8 +153,12 @@ class AkinatorApp(App):
         win_proposal = self.query_one("#win_proposal", WinProposal)
 
         if self._debug:
+            timing = self._engine.last_timing
             self.query_one("#status", StatusBar).flash(
-                f"step={state.step}  progression={state.progression:.1f}%",
+                f"step={state.step}  progression={state.progression:.1f}%"
+                f"  rtt={timing.get('rtt', 0):.0f}ms"
+                f"  server={timing.get('total', 0):.0f}ms"
+                f"  upstream={timing.get('upstream', 0):.0f}ms",
                 duration=5.0,
             )
 
@@ -222,6 +228,9 @@ class AkinatorApp(App):
             status.flash("Session timed out. Please restart.")
             self._game_over = True
             current.show_result("[dim]Session timed out. Please restart.[/dim]")
+        elif isinstance(exc, (OverloadedError, UpstreamUnavailableError)):
+            status.flash("Akinator is busy, try again in a moment")
+            current.show_question(self._cur_step, self._cur_question)
         elif isinstance(exc, (NetworkError, StartupError)):
             status.flash(f"Error: {exc}")
             current.show_question(self._cur_step, self._cur_question)
@@ -233,8 +242,8 @@ class AkinatorApp(App):
     # Helpers                                                              #
     # ------------------------------------------------------------------ #
 
-    def on_unmount(self) -> None:
-        self._engine.close()
+    async def on_unmount(self) -> None:
+        await self._engine.close()
 
     def _set_loading(self, loading: bool) -> None:
         self._loading = loading
@@ -1,9 +1,16 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import json
+import time
+import uuid
 from dataclasses import dataclass
+from urllib.parse import quote
 
 import httpx
-
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed, WebSocketException
 
 # --------------------------------------------------------------------------- #
 # Exceptions                                                                   #
@@ -34,6 +41,12 @@ class SessionNotFound(EngineError): ...
 class NetworkError(EngineError): ...
 
 
+class UpstreamUnavailableError(EngineError): ...
+
+
+class OverloadedError(EngineError): ...
+
+
 # --------------------------------------------------------------------------- #
 # GameState                                                                    #
 # --------------------------------------------------------------------------- #
@@ -62,8 +75,18 @@ _ERROR_MAP: dict[str, type[EngineError]] = {
     "SessionTimeoutError": SessionTimeoutError,
     "SessionNotFound": SessionNotFound,
     "NetworkError": NetworkError,
+    "UpstreamUnavailableError": UpstreamUnavailableError,
+    "OverloadedError": OverloadedError,
+    "IdempotencyKeyReused": EngineError,
 }
 
+# A request that could not connect is sent once more, under the same
+# Idempotency-Key, so the engine applies it at most once either way; the
+# transport retries only connect errors. One that timed out is not: the engine
+# gives up on it, upstream calls included, when this client does, so a retry
+# would start over.
+_CONNECT_RETRIES = 1
+
 
 def _parse_error(response: httpx.Response) -> EngineError:
     try:
@@ -77,8 +100,41 @@ def _parse_error(response: httpx.Response) -> EngineError:
     return exc_cls(message)
 
 
-def _state_from_dict(data: dict) -> GameState:
-    s = data["state"]
+def _frame_error(frame: dict) -> EngineError:
+    detail = frame.get("error") or {}
+    exc_cls = _ERROR_MAP.get(detail.get("error", ""), NetworkError)
+    return exc_cls(detail.get("message", "engine error"))
+
+
+def _parse_server_timing(header: str) -> dict[str, float]:
+    """``"upstream;dur=12.5, total;dur=14"`` -> ``{"upstream": 12.5, "total": 14.0}``."""
+    phases = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                try:
+                    phases[name] = float(value)
+                except ValueError:
+                    pass
+    return phases
+
+
+# Read timeouts per operation, in seconds. Starting a game is the slowest
+# upstream call, and answers applies several in one request.
+_TIMEOUTS: dict[str, httpx.Timeout] = {
+    "warm": httpx.Timeout(3.0),
+    "start": httpx.Timeout(30.0, connect=5.0),
+    "answer": httpx.Timeout(15.0, connect=5.0),
+    "answers": httpx.Timeout(45.0, connect=5.0),
+    "back": httpx.Timeout(15.0, connect=5.0),
+    "choose": httpx.Timeout(15.0, connect=5.0),
+    "exclude": httpx.Timeout(15.0, connect=5.0),
+}
+
+
+def _state_from_dict(s: dict) -> GameState:
     return GameState(
         question=s["question"],
         step=s["step"],
@@ -90,39 +146,79 @@ def _state_from_dict(data: dict) -> GameState:
     )
 
 
-class EngineClient:
-    """HTTP client with the same interface as AkinatorEngine."""
+class _HTTPClient:
+    """Request building and reply handling shared by the HTTP clients."""
 
-    def __init__(self, base_url: str = "http://localhost:8000") -> None:
+    def __init__(self) -> None:
         self._session_id: str | None = None
-        self._http = httpx.Client(base_url=base_url.rstrip("/"), timeout=30.0)
-
-    def start_game(self, language: str = "en") -> GameState:
-        try:
-            resp = self._http.post("/games", json={"language": language})
-        except httpx.RequestError as e:
-            raise NetworkError(str(e)) from e
+        # Milliseconds for the last request: client round trip as "rtt", plus
+        # whatever phases the engine reported in its Server-Timing header.
+        self.last_timing: dict[str, float] = {}
+
+    def _request(
+        self, http: httpx.Client | httpx.AsyncClient, op: str, body: dict | None
+    ) -> httpx.Request:
+        if op == "start":
+            path = "/games"
+        elif self._session_id is None:
+            raise RuntimeError("engine not started")
+        else:
+            path = f"/games/{self._session_id}/{op}"
+        headers = {
+            "Idempotency-Key": uuid.uuid4().hex,
+            "Request-Timeout": f"{_TIMEOUTS[op].read:g}",
+        }
+        return http.build_request(
+            "POST", path, json=body, headers=headers, timeout=_TIMEOUTS[op]
+        )
+
+    def _reply(self, resp: httpx.Response, start: float) -> dict:
+        self.last_timing = {
+            "rtt": (time.perf_counter() - start) * 1000,
+            **_parse_server_timing(resp.headers.get("server-timing", "")),
+        }
         if not resp.is_success:
             raise _parse_error(resp)
-        data = resp.json()
+        return resp.json()
+
+    def _started(self, data: dict) -> GameState:
         self._session_id = data["session_id"]
-        return _state_from_dict(data)
+        return _state_from_dict(data["state"])
 
-    def _call(self, path: str, body: dict | None = None) -> GameState:
-        if self._session_id is None:
-            raise RuntimeError("engine not started")
-        kwargs: dict = {"json": body} if body is not None else {}
+
+class EngineClient(_HTTPClient):
+    """HTTP client with the same interface as AkinatorEngine."""
+
+    def __init__(self, base_url: str = "http://localhost:8000") -> None:
+        super().__init__()
+        self._http = httpx.Client(
+            base_url=base_url.rstrip("/"),
+            transport=httpx.HTTPTransport(retries=_CONNECT_RETRIES),
+        )
+
+    def _send(self, op: str, body: dict | None = None) -> dict:
+        request = self._request(self._http, op, body)
+        start = time.perf_counter()
         try:
-            resp = self._http.post(f"/games/{self._session_id}/{path}", **kwargs)
+            resp = self._http.send(request)
         except httpx.RequestError as e:
             raise NetworkError(str(e)) from e
-        if not resp.is_success:
-            raise _parse_error(resp)
-        return _state_from_dict(resp.json())
+        return self._reply(resp, start)
+
+    def start_game(self, language: str = "en") -> GameState:
+        return self._started(self._send("start", {"language": language}))
+
+    def _call(self, op: str, body: dict | None = None) -> GameState:
+        return _state_from_dict(self._send(op, body)["state"])
 
     def answer(self, key: str) -> GameState:
         return self._call("answer", {"key": key})
 
+    def answer_many(self, keys: list[str]) -> list[GameState]:
+        """Apply several answers in one round trip; stops early on a guess."""
+        data = self._send("answers", {"keys": keys})
+        return [_state_from_dict(s) for s in data["states"]]
+
     def back(self) -> GameState:
         return self._call("back")
 
@@ -134,3 +230,203 @@ class EngineClient:
 
     def close(self) -> None:
         self._http.close()
+
+
+class AsyncEngineClient(_HTTPClient):
+    """EngineClient for asyncio callers, over one kept-alive HTTP/2 connection.
+
+    HTTP/2 is negotiated over TLS, so it applies when the engine sits behind
+    an HTTPS proxy; against a plain ``http://`` engine the connection is a
+    kept-alive HTTP/1.1 one. Call :meth:`warm` early to have it open before
+    the first real request.
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000") -> None:
+        super().__init__()
+        self._http = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=4, keepalive_expiry=120.0),
+                retries=_CONNECT_RETRIES,
+            ),
+        )
+
+    async def warm(self) -> None:
+        """Open the connection (TCP, TLS, HTTP/2 settings) ahead of use."""
+        try:
+            await self._http.head("/", timeout=_TIMEOUTS["warm"])
+        except httpx.RequestError as e:
+            raise NetworkError(str(e)) from e
+
+    async def _send(self, op: str, body: dict | None = None) -> dict:
+        request = self._request(self._http, op, body)
+        start = time.perf_counter()
+        try:
+            resp = await self._http.send(request)
+        except httpx.RequestError as e:
+            raise NetworkError(str(e)) from e
+        return self._reply(resp, start)
+
+    async def start_game(self, language: str = "en") -> GameState:
+        return self._started(await self._send("start", {"language": language}))
+
+    async def _call(self, op: str, body: dict | None = None) -> GameState:
+        return _state_from_dict((await self._send(op, body))["state"])
+
+    async def answer(self, key: str) -> GameState:
+        return await self._call("answer", {"key": key})
+
+    async def answer_many(self, keys: list[str]) -> list[GameState]:
+        """Apply several answers in one round trip; stops early on a guess."""
+        data = await self._send("answers", {"keys": keys})
+        return [_state_from_dict(s) for s in data["states"]]
+
+    async def back(self) -> GameState:
+        return await self._call("back")
+
+    async def choose(self) -> GameState:
+        return await self._call("choose")
+
+    async def exclude(self) -> GameState:
+        return await self._call("exclude")
+
+    async def close(self) -> None:
+        await self._http.aclose()
+
+
+# --------------------------------------------------------------------------- #
+# WebSocket client                                                              #
+# --------------------------------------------------------------------------- #
+
+
+class ChannelClient:
+    """AsyncEngineClient over one WebSocket game channel instead of a request per call.
+
+    The channel is kept alive with WebSocket pings every ``heartbeat``
+    seconds, which also notice a dead connection while the player thinks. If
+    it drops anyway, or the engine closes it as idle, the next call
+    reconnects and resumes the game by session ID.
+    """
+
+    def __init__(
+        self, base_url: str = "http://localhost:8000", heartbeat: float = 20.0
+    ) -> None:
+        base = base_url.rstrip("/")
+        if base.startswith("http"):
+            base = "ws" + base.removeprefix("http")
+        self._url = f"{base}/games/ws"
+        self._heartbeat = heartbeat
+        self._session_id: str | None = None
+        self._ws: ClientConnection | None = None
+        self._next_id = 0
+        self.last_timing: dict[str, float] = {}
+
+    async def _connect(self) -> ClientConnection:
+        if self._ws is not None:
+            return self._ws
+        url = self._url
+        if self._session_id is not None:
+            url += f"?session_id={quote(self._session_id)}"
+        try:
+            ws = await connect(
+                url,
+                open_timeout=_TIMEOUTS["warm"].connect,
+                close_timeout=_TIMEOUTS["warm"].connect,
+                ping_interval=self._heartbeat,
+                ping_timeout=self._heartbeat,
+            )
+        except (OSError, TimeoutError, WebSocketException) as e:
+            raise NetworkError(str(e)) from e
+        self._ws = ws
+        if self._session_id is not None:
+            # Resuming: the engine opens with the game's current state.
+            try:
+                async with asyncio.timeout(_TIMEOUTS["warm"].read):
+                    frame = json.loads(await ws.recv())
+            except (OSError, TimeoutError, WebSocketException) as e:
+                await self._disconnect()
+                raise NetworkError(str(e)) from e
+            if "error" in frame:
+                await self._disconnect()
+                raise _frame_error(frame)
+        return ws
+
+    async def warm(self) -> None:
+        """Open the channel ahead of the first command."""
+        await self._connect()
+
+    async def _disconnect(self) -> None:
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            # Best effort: the channel is being given up on either way.
+            with contextlib.suppress(OSError, WebSocketException):
+                await ws.close()
+
+    async def _request(self, op: str, **fields) -> dict:
+        self._next_id += 1
+        request_id = self._next_id
+        payload = json.dumps({"id": request_id, "op": op, **fields})
+        start = time.perf_counter()
+        ws = await self._connect()
+        try:
+            await ws.send(payload)
+        except ConnectionClosed:
+            # Nothing reached the engine, so it is safe to resume and resend.
+            await self._disconnect()
+            ws = await self._connect()
+            try:
+                await ws.send(payload)
+            except ConnectionClosed as e:
+                await self._disconnect()
+                raise NetworkError(str(e)) from e
+        try:
+            async with asyncio.timeout(_TIMEOUTS[op].read):
+                while True:
+                    frame = json.loads(await ws.recv())
+                    # Anything without our ID is not the reply.
+                    if frame.get("id") == request_id:
+                        break
+        except (ConnectionClosed, TimeoutError) as e:
+            # The command may or may not have been applied; don't resend it.
+            await self._disconnect()
+            raise NetworkError(str(e) or "channel closed") from e
+        self.last_timing = {
+            "rtt": (time.perf_counter() - start) * 1000,
+            **frame.get("timing", {}),
+        }
+        if "error" in frame:
+            raise _frame_error(frame)
+        return frame
+
+    async def start_game(self, language: str = "en") -> GameState:
+        frame = await self._request("start", language=language)
+        self._session_id = frame["session_id"]
+        return _state_from_dict(frame["state"])
+
+    async def _call(self, op: str, **fields) -> GameState:
+        if self._session_id is None:
+            raise RuntimeError("engine not started")
+        return _state_from_dict((await self._request(op, **fields))["state"])
+
+    async def answer(self, key: str) -> GameState:
+        return await self._call("answer", key=key)
+
+    async def answer_many(self, keys: list[str]) -> list[GameState]:
+        """Apply several answers in one round trip; stops early on a guess."""
+        if self._session_id is None:
+            raise RuntimeError("engine not started")
+        frame = await self._request("answers", keys=keys)
+        return [_state_from_dict(s) for s in frame["states"]]
+
+    async def back(self) -> GameState:
+        return await self._call("back")
+
+    async def choose(self) -> GameState:
+        return await self._call("choose")
+
+    async def exclude(self) -> GameState:
+        return await self._call("exclude")
+
+    async def close(self) -> None:
+        await self._disconnect()
@@ -13,9 +13,18 @@ def main() -> None:
         "--engine-url",
         default=os.environ.get("ENGINE_URL", "http://localhost:8000"),
     )
+    parser.add_argument(
+        "--transport",
+        choices=("ws", "http"),
+        default="ws",
+        help="One WebSocket per game, or one HTTP/2 request per answer",
+    )
     args = parser.parse_args()
     AkinatorApp(
-        language=args.language, debug=args.debug, engine_url=args.engine_url
+        language=args.language,
+        debug=args.debug,
+        engine_url=args.engine_url,
+        transport=args.transport,
     ).run()
 
 